@@ -0,0 +1,126 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# End-to-end cost of the headless loop of demo.py, and of drawing and
+# saving the frames of the plots
+
+from whiskers.runner import make_config, run_simulation
+from whiskers.mkvideo import vidManager
+from whiskers.sim import Sim
+from whiskers import kernel
+import numpy as np
+import tempfile
+import shutil
+import os
+
+STIME = 2000
+
+
+class HeadlessLoop:
+    params = [["python", "numba"]]
+    param_names = ["backend"]
+    timeout = 300
+
+    def setup(self, backend):
+        # the numba backend needs the touch tables
+        touch_tol = None
+        if backend == "numba":
+            if not kernel.HAVE_NUMBA:
+                raise NotImplementedError("numba is not installed")
+            touch_tol = 1e-6
+            # compile outside the measures
+            run_simulation({"stime": 10, "seed": 0, "backend": backend,
+                            "touch_tol": touch_tol})
+        self.config = make_config(stime=STIME, seed=0, backend=backend,
+                                  touch_tol=touch_tol)
+
+    def time_run_simulation(self, backend):
+        run_simulation(self.config)
+
+    def peakmem_run_simulation(self, backend):
+        run_simulation(self.config)
+
+
+class PlotterDraw:
+    """
+    Per-frame cost of Plotter.draw, replaying the frames of a short run
+    as demo.py does, so the plotted history grows along the measures
+    """
+    params = [[False, True]]
+    param_names = ["blit"]
+
+    def setup(self, blit):
+        import matplotlib
+        matplotlib.use("Agg")
+        from whiskers.plotter import Plotter
+
+        config = make_config(stime=STIME, seed=0)
+        self.traj = run_simulation(config)
+        self.sim = Sim("bench", config["type"], STIME)
+        self.plotter = Plotter(self.sim, STIME, config["type"],
+                               save=False, blit=blit)
+        self.frame = 0
+
+    def teardown(self, blit):
+        import matplotlib.pyplot as plt
+        plt.close("all")
+
+    def time_draw(self, blit):
+        frames = self.traj["frames"]
+        t = frames[self.frame % len(frames)]
+        self.frame += 1
+        self.sim.move_box(t)
+        self.sim.update(self.traj["x"][t, 0], self.traj["mu"][t, 0])
+        self.plotter.replay(t, self.traj)
+        self.plotter.draw()
+
+
+class SaveFrame:
+    """
+    Per-frame cost of vidManager.save_frame, saving images or streaming
+    them into a gif
+    """
+    params = [[False, True]]
+    param_names = ["stream"]
+
+    def setup(self, stream):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        self.dir = tempfile.mkdtemp()
+        self.fig = plt.figure(figsize=(5, 5))
+        self.fig.add_subplot(111).plot(np.random.RandomState(0).randn(1000))
+        self.vm = vidManager(self.fig, name="frame",
+                             dirname=os.path.join(self.dir, "frames"),
+                             duration=100, stream=stream)
+
+    def teardown(self, stream):
+        import matplotlib.pyplot as plt
+        if stream:
+            self.vm.mk_video()
+        plt.close("all")
+        shutil.rmtree(self.dir)
+
+    def time_save_frame(self, stream):
+        self.vm.save_frame()
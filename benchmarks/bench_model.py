@@ -0,0 +1,73 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Steps per second of GP.update and GM.update, with the whiskers of a
+# single agent or with a batch of agents of two whiskers each
+
+from whiskers.GP import GP
+from whiskers.GM import GM
+import numpy as np
+
+SIZES = [1, 2, 64, 4096]
+
+
+class GPUpdate:
+    params = [["whiskers", "agents"], SIZES]
+    param_names = ["layout", "n"]
+
+    def setup(self, layout, n):
+        if layout == "whiskers":
+            self.gp = GP(dt=0.01, alpha=np.ones(n),
+                         rng=np.random.RandomState(0))
+        else:
+            self.gp = GP(dt=0.01, rng=np.random.RandomState(0), n_agents=n)
+        self.gp.effective_object_position[...] = 0.5
+        self.action = np.zeros(self.gp.a.shape)
+
+    def time_update(self, layout, n):
+        self.gp.update(self.action)
+
+
+class GMUpdate:
+    params = [["whiskers", "agents"], SIZES]
+    param_names = ["layout", "n"]
+
+    def setup(self, layout, n):
+        rng = np.random.RandomState(0)
+        if layout == "whiskers":
+            self.gm = GM(dt=0.01, nu=np.ones(n))
+            self.x = 0.3
+        else:
+            self.gm = GM(dt=0.01, n_agents=n)
+            self.x = rng.randn(n)
+        self.s_t = rng.rand(*self.gm.nu.shape)
+        self.s_p = rng.randn(*self.gm.nu.shape)
+        # constant inputs make mu drift, and cosh overflows to inf
+        # (which the touch terms handle) after many calls
+        self.errors = np.seterr(over="ignore")
+
+    def teardown(self, layout, n):
+        np.seterr(**self.errors)
+
+    def time_update(self, layout, n):
+        self.gm.update(self.s_t, self.s_p, self.x)
@@ -0,0 +1,59 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Throughput of the environment: box schedule and collision limits
+
+from whiskers.sim import Sim
+
+STIME = 20000
+
+
+class SimCollision:
+    params = [["still", "normal", "large"]]
+    param_names = ["type"]
+
+    def setup(self, type):
+        self.sim = Sim("bench", type, STIME)
+        self.box_vertex = self.sim.schedule()["box_vertex"]
+        self.t = 0
+
+    def time_move_box(self, type):
+        # whole-run tables, as in the simulation loop
+        self.t = (self.t + 1) % STIME
+        self.sim.move_box(self.t)
+
+    def time_move_box_untabled(self, type):
+        # positions and limits computed at each call
+        self.t = (self.t + 1) % STIME
+        self.sim.move_box(float(self.t))
+
+    def time_detect_collision(self, type):
+        self.sim.detect_collision()
+
+    def time_schedule(self, type):
+        self.sim.table = None
+        self.sim.schedule()
+
+    def time_collision_limits(self, type):
+        # one vectorized pass over all the steps of a run
+        self.sim.collision_limits(self.box_vertex)
@@ -0,0 +1,271 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Runner of the benchmarks of this folder. Each result is appended as a
+# json line to a history file, together with the commit and the machine
+# it was measured on, and compared with the last result of the same
+# benchmark on an earlier commit, so that slowdowns of the hot loop show
+# up as soon as they are introduced.
+
+import importlib
+import itertools
+import subprocess
+import tracemalloc
+import platform
+import datetime
+import timeit
+import glob
+import json
+import sys
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+HISTORY = os.path.join(HERE, "results", "history.jsonl")
+
+
+def discover(pattern=None):
+    """
+    Find the benchmarks of the bench_*.py modules
+
+    Args:
+        pattern: str, only benchmarks whose name contains it are kept
+
+    Returns:
+        list of (name, class, method name) tuples
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    found = []
+    for path in sorted(glob.glob(os.path.join(HERE, "bench_*.py"))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        module = importlib.import_module("benchmarks." + module_name)
+        for class_name, cls in sorted(vars(module).items()):
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            for method in sorted(vars(cls)):
+                if method.startswith(("time_", "peakmem_")):
+                    name = ".".join([module_name, class_name, method])
+                    if pattern is None or pattern in name:
+                        found.append((name, cls, method))
+    return found
+
+
+def param_sets(cls):
+    params = getattr(cls, "params", [])
+    if len(params) == 0:
+        return [()]
+    if not isinstance(params[0], (list, tuple)):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def measure_time(func, repeat=5, min_time=0.1):
+    """
+    Time a function as timeit does, calling it enough times to last at
+    least min_time for each of repeat samples
+
+    Returns:
+        dict, seconds per call of the best and of the median sample
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number*min_time/0.2))
+    samples = sorted(t/number for t in timer.repeat(repeat, number))
+    return {"value": samples[0], "median": samples[len(samples)//2],
+            "number": number, "repeat": repeat, "unit": "seconds"}
+
+
+def measure_peakmem(func):
+    """
+    Peak memory allocated while running a function, as traced by
+    tracemalloc (numpy arrays included)
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"value": peak, "unit": "bytes"}
+
+
+def environment():
+    """
+    Commit and machine of the measures
+    """
+    def git(*args):
+        try:
+            return subprocess.run(["git"] + list(args), cwd=ROOT,
+                                  capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    import numpy as np
+    env = {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+    try:
+        import numba
+        env["numba"] = numba.__version__
+    except ImportError:
+        env["numba"] = None
+    return env
+
+
+def run(pattern=None, history=HISTORY, repeat=5):
+    """
+    Run the benchmarks and append their results to the history
+
+    Returns:
+        list of dict, the results, with the error message under
+        "failed" for the benchmarks that raised
+    """
+    env = environment()
+    results = []
+    for name, cls, method in discover(pattern):
+        for params in param_sets(cls):
+            bench = cls()
+            label = "%s(%s)" % (name, ", ".join(map(str, params)))
+            func = getattr(bench, method)
+            ready = False
+            try:
+                if hasattr(bench, "setup"):
+                    bench.setup(*params)
+                ready = True
+                if method.startswith("time_"):
+                    result = measure_time(lambda: func(*params), repeat)
+                else:
+                    result = measure_peakmem(lambda: func(*params))
+            except NotImplementedError as e:
+                print("%-60s skipped (%s)" % (label, e))
+                continue
+            except Exception as e:
+                # a broken benchmark is recorded and does not stop the
+                # others
+                result = {"value": None, "unit": None,
+                          "failed": "%s: %s" % (type(e).__name__, e)}
+            finally:
+                if ready and hasattr(bench, "teardown"):
+                    bench.teardown(*params)
+            result.update(benchmark=name, params=[str(p) for p in params],
+                          **env)
+            results.append(result)
+            print("%-60s %s" % (label, format_value(result)))
+
+    os.makedirs(os.path.dirname(history), exist_ok=True)
+    with open(history, "a") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    return results
+
+
+def format_value(result):
+    if result.get("failed"):
+        return "failed (%s)" % result["failed"]
+    value = result["value"]
+    if result["unit"] == "bytes":
+        return "%8.1f MiB" % (value/2**20)
+    for scale, unit in [(1, "s"), (1e-3, "ms"), (1e-6, "us")]:
+        if value >= scale:
+            break
+    return "%8.2f %s" % (value/scale, unit)
+
+
+def load(history=HISTORY):
+    if not os.path.exists(history):
+        return []
+    with open(history) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results, history=HISTORY, threshold=0.2):
+    """
+    Compare results with the last ones of the same benchmarks, measured
+    on the same machine for another commit
+
+    Args:
+        results: list of dict, the new results
+        history: str, the history file
+        threshold: float, relative increase flagged as a regression
+
+    Returns:
+        list of (label, previous, current, ratio) tuples, the regressions
+    """
+    previous = {}
+    for record in load(history):
+        if record.get("failed"):
+            continue
+        key = (record["benchmark"], tuple(record["params"]),
+               record["machine"])
+        previous.setdefault(key, []).append(record)
+
+    regressions = []
+    for result in results:
+        if result.get("failed"):
+            continue
+        key = (result["benchmark"], tuple(result["params"]),
+               result["machine"])
+        older = [r for r in previous.get(key, [])
+                 if r["commit"] != result["commit"]]
+        if len(older) == 0:
+            continue
+        ratio = result["value"]/older[-1]["value"]
+        if ratio > 1 + threshold:
+            label = "%s(%s)" % (result["benchmark"],
+                                ", ".join(result["params"]))
+            regressions.append((label, older[-1], result, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--bench", default=None,
+                        help="run only the benchmarks whose name "
+                        "contains this string")
+    parser.add_argument("-o", "--history", default=HISTORY,
+                        help="json lines file the results are appended to")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="number of timing samples")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    results = run(args.bench, args.history, args.repeat)
+    regressions = compare(results, args.history, args.threshold)
+    for label, old, new, ratio in regressions:
+        print("REGRESSION %s: %s -> %s (x%.2f, commit %s)" % (
+            label, format_value(old), format_value(new), ratio,
+            (old["commit"] or "?")[:8]))
+    failed = [result for result in results if result.get("failed")]
+    sys.exit(1 if len(regressions) > 0 or len(failed) > 0 else 0)
@@ -0,0 +1,306 @@
+# Copyright (c) 2021 Federico Maggiore, Francesco Mannella
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from .lut import shared_table
+from .stats import ModelStats
+import numpy as np
+
+
+def solve3(A, b):
+    """
+    Solve a batch of 3x3 linear systems in closed form (Cramer's rule),
+    which for such small systems is much faster than np.linalg.solve
+
+    Args:
+        A: array (..., 3, 3), the matrices
+        b: array (..., 3), the right hand sides
+
+    Returns:
+        array (..., 3), the solutions
+    """
+    # entries first, so that each of them is a contiguous array
+    (a, b_, c), (d, e, f), (g, h, i) = np.ascontiguousarray(
+        np.moveaxis(A, (-2, -1), (0, 1)))
+    # cofactors of the first row, then the inverse of A times b
+    co_a = e*i - f*h
+    co_b = f*g - d*i
+    co_c = d*h - e*g
+    det = a*co_a + b_*co_b + c*co_c
+    r0, r1, r2 = np.moveaxis(b, -1, 0)/det
+    x = np.empty(np.shape(b))
+    x[..., 0] = co_a*r0 + (c*h - b_*i)*r1 + (b_*f - c*e)*r2
+    x[..., 1] = co_b*r0 + (a*i - c*g)*r1 + (c*d - a*f)*r2
+    x[..., 2] = co_c*r0 + (b_*g - a*h)*r1 + (a*e - b_*d)*r2
+    return x
+
+
+class GM:
+
+    def __init__(self, dt, eta=0.001, eta_d=1., eta_a=0.06, eta_nu=0.01, nu=[1., 1.],
+                 n_agents=None, touch_tol=None, tabulated=False,
+                 integrator="euler"):
+        # When n_agents is given mu, dmu, nu and the variances carry a
+        # leading batch axis of shape (n_agents, n_whiskers), matching a
+        # GP created with the same n_agents.
+        # With touch_tol the tanh and sech of the touch function are
+        # tabulated with that error (see lut.SaturatingTable) for the
+        # compiled kernel, and read by update only with tabulated (see
+        # GP).
+        # integrator is "euler" for the explicit gradient steps, or
+        # "implicit" for linearized implicit steps (see implicit_step),
+        # which stay stable at larger dt.
+        if integrator not in ("euler", "implicit"):
+            raise ValueError("unknown integrator %r" % (integrator,))
+        self.integrator = integrator
+
+        # Parameter that regulates whiskers amplitude oscillation
+        self.nu = np.array(nu, dtype=float)
+        if n_agents is not None:
+            self.nu = np.broadcast_to(
+                self.nu, (n_agents, self.nu.shape[-1])).copy()
+        # Vector \vec{\mu} initialized with the GP initial conditions
+        self.mu = np.zeros(self.nu.shape)
+        # Vector \dot{\vec{\mu}}
+        self.dmu = np.zeros(self.nu.shape)
+        # Variances (inverse of precisions) of sensory proprioceptive inputs
+        self.Sigma_s_p = np.ones(self.nu.shape)*0.01
+        # Variances (inverse of precisions) of sensory touch inputs
+        self.Sigma_s_t = np.ones(self.nu.shape)*0.032  # np.array(Sigma_s_t)
+        # Internal variables precisions
+        self.Sigma_mu = np.ones(self.nu.shape)*0.01  # np.array(Sigma_mu)
+
+        # Action variable (in this case the action is intended as the increment of the variable that the agent is allowed to modified)
+        self.da = 0.
+        # Size of a simulation step
+        self.dt = dt
+        # Gradient descent weights
+        self.eta = eta
+        self.eta_d = eta_d
+        self.eta_a = eta_a
+        self.eta_nu = eta_nu
+        self.touch_table = None
+        if touch_tol is not None:
+            self.touch_table = shared_table(touch_tol)
+        if tabulated and touch_tol is None:
+            raise ValueError("tabulated needs touch_tol")
+        self.tabulated = tabulated
+        # Streaming summaries of the updates (see track_stats)
+        self.stats = None
+
+    # Keep running summaries of the prediction errors, of the free
+    # energy and of the convergence of nu toward target (e.g. a view of
+    # gp.a) at each update, see stats.ModelStats
+    def track_stats(self, tol=0.05, target=None):
+        self.stats = ModelStats(self.nu.shape, tol, target)
+        return self.stats
+
+    # State of the model (parameters excluded), so that a run can be
+    # saved and resumed
+    def get_state(self):
+        state = {name: np.array(getattr(self, name))
+                 for name in ["mu", "dmu", "nu", "da"]}
+        return state
+
+    def set_state(self, state):
+        for name in ["mu", "dmu", "nu"]:
+            getattr(self, name)[...] = state[name]
+        self.da = np.array(state["da"]) if np.ndim(state["da"]) > 0 \
+            else float(state["da"])
+
+    # Touch function
+    def g_touch(self, x, v, prec=50):
+        return 1/np.cosh(prec*v)*(0.5*np.tanh(prec*x)+0.5)
+
+    # Derivative of the touch function with respect to v
+    def dg_dv(self, x, v, prec=50):
+        return -prec*1/np.cosh(prec*v)*np.tanh(prec*v)*(0.5 * np.tanh(prec*x) + 0.5)
+
+    # Derivative of the touch function with respect to x
+    def dg_dx(self, x, v, prec=50):
+        return 1/np.cosh(prec*v)*0.5*prec*(1/np.cosh(prec*x))**2
+
+    # Touch function and its derivatives with respect to v and x, with
+    # the shared tanh and cosh evaluated once. Without tables the values
+    # are those of g_touch, dg_dv and dg_dx bit for bit.
+    def touch_terms(self, x, v, prec=50):
+        if not self.tabulated:
+            cosh_v = np.cosh(prec*v)
+            sech_v = 1/cosh_v
+            dsech_v = -prec*1/cosh_v
+            tanh_v = np.tanh(prec*v)
+            tanh_x = np.tanh(prec*x)
+            sech_x = 1/np.cosh(prec*x)
+        else:
+            sech_v = self.touch_table.sech(prec*v)
+            dsech_v = -prec*sech_v
+            tanh_v = self.touch_table.tanh(prec*v)
+            tanh_x = self.touch_table.tanh(prec*x)
+            sech_x = self.touch_table.sech(prec*x)
+        h = 0.5*tanh_x + 0.5
+        return sech_v*h, dsech_v*tanh_v*h, sech_v*0.5*prec*sech_x**2
+
+    # Second derivatives of the touch function with respect to x and x,
+    # x and v, and v and v
+    def touch_curvature(self, x, v, prec=50):
+        if not self.tabulated:
+            sech_v = 1/np.cosh(prec*v)
+            tanh_v = np.tanh(prec*v)
+            tanh_x = np.tanh(prec*x)
+            sech_x = 1/np.cosh(prec*x)
+        else:
+            sech_v = self.touch_table.sech(prec*v)
+            tanh_v = self.touch_table.tanh(prec*v)
+            tanh_x = self.touch_table.tanh(prec*x)
+            sech_x = self.touch_table.sech(prec*x)
+        h = 0.5*tanh_x + 0.5
+        p2 = prec*prec
+        d2g_dx2 = -p2*sech_v*sech_x**2*tanh_x
+        d2g_dxdv = -0.5*p2*sech_v*tanh_v*sech_x**2
+        d2g_dv2 = -p2*h*sech_v*(sech_v**2 - tanh_v**2)
+        return d2g_dx2, d2g_dxdv, d2g_dv2
+
+    # Time derivatives of mu, dmu and nu, and rate of change of the
+    # action, of the gradient flow of which update is the Euler step.
+    # Unlike update it leaves the state of the model untouched.
+    def derivatives(self, touch_sensory_states, proprioceptive_sensory_states,
+                    x, mu, dmu, nu):
+        touch_pred, dg_dv, dg_dx = self.touch_terms(x=mu, v=dmu)
+
+        PE_mu = dmu - (nu*x - mu)
+        PE_s_p = proprioceptive_sensory_states - dmu
+        PE_s_t = touch_sensory_states - touch_pred
+
+        dF_dmu = PE_mu/self.Sigma_mu \
+            - dg_dx*PE_s_t/self.Sigma_s_t
+        dF_d_dmu = PE_mu/self.Sigma_mu \
+            - PE_s_p/self.Sigma_s_p \
+            - dg_dv*PE_s_t/self.Sigma_s_t
+
+        d_mu = dmu - self.eta*dF_dmu
+        d_dmu = -self.eta_d*dF_d_dmu
+        d_nu = self.eta_nu*x*PE_mu/self.Sigma_mu
+        d_a = -self.eta_a*(x*PE_s_p/self.Sigma_s_p + PE_s_t/self.Sigma_s_t)
+        return d_mu, d_dmu, d_nu, d_a
+
+    # Jacobian of the time derivatives of mu, dmu and nu (see
+    # derivatives) with respect to mu, dmu and nu, shape (..., 3, 3)
+    # with rows the derivatives and columns the variables
+    def jacobian(self, touch_sensory_states, proprioceptive_sensory_states,
+                 x, mu, dmu, nu):
+        touch_pred, dg_dv, dg_dx = self.touch_terms(x=mu, v=dmu)
+        PE_s_t = touch_sensory_states - touch_pred
+        return self._jacobian(x, mu, dmu, nu, PE_s_t, dg_dv, dg_dx)
+
+    def _jacobian(self, x, mu, dmu, nu, PE_s_t, dg_dv, dg_dx):
+        d2g_dx2, d2g_dxdv, d2g_dv2 = self.touch_curvature(x=mu, v=dmu)
+        x = np.broadcast_to(x, np.shape(nu))
+        P_mu = 1/self.Sigma_mu
+        P_s_p = 1/self.Sigma_s_p
+        P_s_t = 1/self.Sigma_s_t
+
+        # Hessian of the free energy in (mu, dmu) and its derivatives
+        # with respect to nu
+        F_mm = P_mu - (d2g_dx2*PE_s_t - dg_dx**2)*P_s_t
+        F_md = P_mu - (d2g_dxdv*PE_s_t - dg_dx*dg_dv)*P_s_t
+        F_dd = P_mu + P_s_p - (d2g_dv2*PE_s_t - dg_dv**2)*P_s_t
+        F_n = -x*P_mu
+
+        J = np.empty(np.shape(nu) + (3, 3))
+        J[..., 0, 0] = -self.eta*F_mm
+        J[..., 0, 1] = 1 - self.eta*F_md
+        J[..., 0, 2] = -self.eta*F_n
+        J[..., 1, 0] = -self.eta_d*F_md
+        J[..., 1, 1] = -self.eta_d*F_dd
+        J[..., 1, 2] = -self.eta_d*F_n
+        J[..., 2, 0] = self.eta_nu*x*P_mu
+        J[..., 2, 1] = self.eta_nu*x*P_mu
+        J[..., 2, 2] = -self.eta_nu*x*x*P_mu
+        return J
+
+    # Linearized implicit (Rosenbrock-Euler) step of mu, dmu and nu from
+    # the prediction errors and gradients computed by update, solving
+    # (I - dt J) delta = dt f for each whisker of each agent at once
+    def implicit_step(self, x, dg_dv, dg_dx):
+        J = self._jacobian(x, self.mu, self.dmu, self.nu, self.PE_s_t,
+                           dg_dv, dg_dx)
+        f = np.empty(J.shape[:-1])
+        f[..., 0] = self.dmu - self.eta*self.dF_dmu
+        f[..., 1] = -self.eta_d*self.dF_d_dmu
+        f[..., 2] = self.eta_nu*x*self.PE_mu/self.Sigma_mu
+        delta = solve3(np.eye(3) - self.dt*J, self.dt*f)
+        self.mu += delta[..., 0]
+        self.dmu += delta[..., 1]
+        self.nu += delta[..., 2]
+
+    # Function that implement the update of internal variables.
+
+    def update(self, touch_sensory_states, proprioceptive_sensory_states, x):
+        # touch_sensory_states  and proprioceptive_sensory_states arguments come from GP (both arrays have dimension equal to the number of whiskers)
+        # Returns action increment
+        # In batched mode x is the per-agent oscillator, shape (n_agents,),
+        # and it is broadcast over the whiskers of each agent.
+        if self.nu.ndim > 1 and np.ndim(x) == self.nu.ndim - 1:
+            x = np.asarray(x)[..., None]
+
+        self.s_p = proprioceptive_sensory_states
+        self.s_t = touch_sensory_states
+        self.touch_pred, dg_dv, dg_dx = self.touch_terms(x=self.mu, v=self.dmu)
+
+        self.PE_mu = self.dmu - (self.nu*x - self.mu)
+        self.PE_s_p = self.s_p-self.dmu
+        self.PE_s_t = self.s_t-self.touch_pred
+
+        self.dF_dmu = self.PE_mu/self.Sigma_mu \
+            - dg_dx*self.PE_s_t/self.Sigma_s_t
+
+        self.dF_d_dmu = self.PE_mu/self.Sigma_mu \
+            - self.PE_s_p/self.Sigma_s_p \
+            - dg_dv * \
+            self.PE_s_t/self.Sigma_s_t
+
+        # Action update
+        # case with dg/da = 1
+        self.da = -self.dt*self.eta_a * \
+            (x*self.PE_s_p/self.Sigma_s_p + self.PE_s_t/self.Sigma_s_t)
+
+        if self.integrator == "implicit":
+            # The action stays the explicit one above
+            self.implicit_step(x, dg_dv, dg_dx)
+        else:
+            # Learning internal parameter nu
+            self.nu += -self.dt*self.eta_nu*(-x*self.PE_mu/self.Sigma_mu)
+
+            self.mu += self.dt*(self.dmu - self.eta*self.dF_dmu)
+            self.dmu += -self.dt*self.eta_d*self.dF_d_dmu
+
+        if self.stats is not None:
+            shape = (1,) + self.nu.shape
+            self.stats.update(
+                np.broadcast_to(self.PE_mu, shape),
+                np.broadcast_to(self.PE_s_p, shape),
+                np.broadcast_to(self.PE_s_t, shape),
+                self.nu[None],
+                (self.Sigma_mu, self.Sigma_s_p, self.Sigma_s_t))
+
+        return self.da
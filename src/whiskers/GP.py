@@ -0,0 +1,322 @@
+# Copyright (c) 2021  Federico Maggiore, Francesco Mannella
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .noise import NoiseStream, draw_normal, rng_state, set_rng_state
+from .lut import shared_table
+import numpy as np
+
+
+class GP:
+
+    def __init__(self, dt, omega2_GP=0.5, alpha=[1., 1.], rng=None,
+                 n_agents=None, noise_block=None, agent_ids=None,
+                 touch_tol=None, tabulated=False):
+        # When n_agents is given all state arrays carry a leading batch
+        # axis, so that cpg has shape (n_agents, 2) and x, a, s_p, s_t
+        # have shape (n_agents, n_whiskers). omega2_GP may then also be
+        # an array of shape (n_agents,) holding one frequency per agent.
+        #
+        # rng is a RandomState or a Generator, from which noise is drawn
+        # at each step, or an int seed (or SeedSequence), which gives each
+        # agent its own counter-based stream (see noise.NoiseStream).
+        # With noise_block, or with a seed, noise is generated in blocks
+        # of that many steps. agent_ids are the ids of the agents of the
+        # batch within a larger ensemble split across processes.
+        # With touch_tol the tanh of the touch function is tabulated with
+        # that error (see lut.SaturatingTable) for the compiled kernel.
+        # update reads the table only with tabulated, to reproduce a
+        # compiled run bit for bit, and np.tanh otherwise, which numpy
+        # evaluates faster than any lookup.
+
+        if rng is None:
+            rng = np.random.RandomState()
+        self.rng = rng
+
+        # Harmonic oscillator angular frequency (both x_0 and x_2)
+        self.omega2 = np.asarray(omega2_GP, dtype=float)
+        # Parameter that regulates whiskers amplitude oscillation
+        self.a = np.array(alpha, dtype=float)
+        if n_agents is not None:
+            self.a = np.broadcast_to(
+                self.a, (n_agents, self.a.shape[-1])).copy()
+        # Variable representing the central pattern generator
+        self.cpg = np.zeros(self.a.shape[:-1] + (2,))
+        self.cpg[..., 1] = 0.5
+        # Whiskers base angles
+        self.x = np.zeros(self.a.shape)
+        # Array storing proprioceptive sensory inputs (whiskers angular velocity)
+        self.s_p = self.a*self.cpg[..., 0, None] - self.x
+        # Array storing touch sensory inputs
+        self.s_t = np.zeros(self.a.shape)
+        # Variance of the Gaussian noise that gives proprioceptive sensory inputs
+        self.Sigma_s_p = np.ones(self.a.shape)*0.05
+        # Variance of the Gaussian noise that gives touch sensort inputs
+        self.Sigma_s_t = np.ones(self.a.shape)*0.
+        # Size of a simulation step
+        self.dt = dt
+        # Time variable
+        self.t = 0.
+        self.effective_object_position = 1.0e10*np.ones(self.a.shape)
+        self.touch_table = None
+        if touch_tol is not None:
+            self.touch_table = shared_table(touch_tol)
+        if tabulated and touch_tol is None:
+            raise ValueError("tabulated needs touch_tol")
+        self.tabulated = tabulated
+        # Source of pre-generated noise blocks (None to draw at each step)
+        self.noise = None
+        if noise_block is not None or not isinstance(
+                rng, (np.random.RandomState, np.random.Generator)):
+            if n_agents is not None and agent_ids is None:
+                agent_ids = np.arange(n_agents)
+            self.noise = NoiseStream(self.a.shape + (2,), rng=rng,
+                                     block=noise_block or 1024,
+                                     agent_ids=agent_ids)
+
+    # Standard normal noise of the next step (n_steps=None) or of the
+    # next n_steps steps, with shape (n_steps, ..., n_whiskers, 2)
+    def draw_noise(self, n_steps=None):
+        if self.noise is not None:
+            return self.noise.draw(n_steps)
+        shape = self.x.shape + (2,)
+        if n_steps is not None:
+            shape = (n_steps,) + shape
+        return draw_normal(self.rng, shape)
+
+    # State of the process (parameters excluded), including the state
+    # of the source of noise, so that a run can be saved and resumed
+    def get_state(self):
+        state = {name: np.array(getattr(self, name)) for name in
+                 ["cpg", "x", "a", "s_p", "s_t", "effective_object_position"]}
+        state["t"] = self.t
+        if self.noise is not None:
+            state["noise"] = self.noise.get_state()
+        else:
+            state["rng"] = rng_state(self.rng)
+        return state
+
+    def set_state(self, state):
+        for name in ["cpg", "x", "a", "s_p", "s_t",
+                     "effective_object_position"]:
+            getattr(self, name)[...] = state[name]
+        self.t = state["t"]
+        if self.noise is not None:
+            self.noise.set_state(state["noise"])
+        else:
+            set_rng_state(self.rng, state["rng"])
+
+    # Function that regulates object position
+    def obj_pos(self, t, obj_interval):
+        if t > obj_interval[0] and t < obj_interval[1]:
+            return self.object_position
+        else:
+            return np.array([10., 10.])
+
+    # Discrete function that return if a whisker has touched
+
+    def touch(self, x, object):
+        if x >= object:
+            return 1.
+        else:
+            return 0.
+
+    # Continuous function that return if a whisker has touched
+    def touch_cont(self, x, platform_position, prec=100):
+        if self.tabulated:
+            return 0.5 * (self.touch_table.tanh(prec*(x-platform_position)) + 1)
+        return 0.5 * (np.tanh(prec*(x-platform_position)) + 1)
+
+    # Function that implement dynamics of the process.
+    def update(self, action):
+        # Action argument (double) is the variable that comes from the GM that modifies alpha
+        # variable affecting the amplitude of the oscillation.
+
+        if self.cpg.ndim == 1:
+            self.update_single(action)
+            return
+
+        # Increment of time variable
+        self.t += self.dt
+        # Increment of alpha variable (that changes the amplitude) given by agent's action
+        self.a += action
+        # GP dynamics implementation
+        self.cpg[..., 0] += self.dt*(self.cpg[..., 1])
+        self.cpg[..., 1] += -self.dt*(self.omega2*self.cpg[..., 0])
+        cpg = self.cpg[..., 0, None]
+        self.x += self.dt*(self.a*cpg - self.x)
+
+        # object Action on touch sensory inputs. Noise is drawn as one
+        # (..., n_whiskers, 2) block, which gives the same sequence of
+        # draws as alternating touch and proprioceptive noise whisker by
+        # whisker.
+        noise = self.draw_noise()
+        self.s_t[...] = self.touch_cont(
+            self.x, self.effective_object_position) \
+            + self.Sigma_s_t*noise[..., 0]
+        contact = self.x > self.effective_object_position
+        self.s_p[...] = np.where(contact, 0., self.a*cpg - self.x)
+        np.copyto(self.x, self.effective_object_position, where=contact)
+        self.s_p += self.Sigma_s_p*noise[..., 1]
+
+    # update of a process without batch axis, equal to it bit for bit.
+    # The pattern generator is stepped on python floats and the whisker
+    # arrays in place, which avoids most of the temporaries of the
+    # batched update on the few whiskers of a single agent.
+    def update_single(self, action):
+        self.t += self.dt
+        self.a += action
+        cpg0, cpg1 = self.cpg.tolist()
+        cpg0 += self.dt*cpg1
+        cpg1 += -self.dt*(float(self.omega2)*cpg0)
+        self.cpg[0] = cpg0
+        self.cpg[1] = cpg1
+        x = self.x
+        position = self.effective_object_position
+        drive = self.a*cpg0
+        x += self.dt*(drive - x)
+
+        noise = self.draw_noise()
+        if not self.tabulated:
+            s_t = self.s_t
+            np.subtract(x, position, out=s_t)
+            s_t *= 100
+            np.tanh(s_t, out=s_t)
+            s_t += 1
+            s_t *= 0.5
+        else:
+            self.s_t[...] = self.touch_cont(x, position)
+        self.s_t += self.Sigma_s_t*noise[:, 0]
+        contact = x > position
+        np.subtract(drive, x, out=self.s_p)
+        np.copyto(self.s_p, 0., where=contact)
+        np.minimum(x, position, out=x)
+        self.s_p += self.Sigma_s_p*noise[:, 1]
+
+    # Powers M^1 ... M^n_steps of the matrix M of one Euler step of the
+    # central pattern generator, shape (n_steps,) + cpg.shape[:-1] +
+    # (2, 2), so that the batch axis of a batched process follows the
+    # step axis even when omega2 is a scalar, computed by doubling the
+    # block of the powers already known
+    def cpg_powers(self, n_steps):
+        omega2 = np.broadcast_to(self.omega2, np.broadcast_shapes(
+            self.omega2.shape, self.cpg.shape[:-1]))
+        M = np.empty(omega2.shape + (2, 2))
+        M[..., 0, 0] = 1.
+        M[..., 0, 1] = self.dt
+        M[..., 1, 0] = -self.dt*omega2
+        M[..., 1, 1] = 1. - self.dt*self.dt*omega2
+        powers = M[None]
+        while len(powers) < n_steps:
+            powers = np.concatenate([powers, powers[-1] @ powers])
+        return powers[:n_steps]
+
+    # Open-loop rollout of n_steps steps at once, equal up to rounding
+    # to as many calls of update. actions are the increments of a at
+    # each step and object_positions the effective object positions,
+    # both broadcast to (n_steps,) + a.shape (None for no action and
+    # for the current positions). Returns the (n_steps, ...) arrays of
+    # cpg, x, a, s_p and s_t, and leaves the process at the last step.
+    def rollout(self, n_steps, actions=None, object_positions=None):
+        shape = (n_steps,) + self.a.shape
+        if actions is None:
+            a = np.broadcast_to(self.a, shape)
+        else:
+            a = np.cumsum(np.concatenate(
+                [self.a[None], np.broadcast_to(actions, shape)]), axis=0)[1:]
+        if object_positions is None:
+            object_positions = self.effective_object_position
+        limit = np.broadcast_to(object_positions, shape)
+
+        cpg = (self.cpg_powers(n_steps) @ self.cpg[..., None])[..., 0]
+        cpg0 = cpg[..., 0, None]
+
+        # Each step of x is the map x -> min(r x + u, limit), with
+        # r = 1 - dt, and the composition of two such maps is again one
+        # of them, min(A x + B, C). An inclusive scan composes the maps
+        # of all the steps in log2(n_steps) passes, which gives both the
+        # filtering of a*cpg and the clipping at the contacts.
+        r = 1. - self.dt
+        A = np.full(shape, r)
+        B = self.dt*a*cpg0
+        C = np.array(limit, dtype=float)
+        shift = 1
+        while shift < n_steps:
+            A1, B1, C1 = A[:-shift], B[:-shift], C[:-shift]
+            A2, B2, C2 = A[shift:], B[shift:], C[shift:]
+            C = np.concatenate([C[:shift], np.minimum(A2*C1 + B2, C2)])
+            B = np.concatenate([B[:shift], A2*B1 + B2])
+            A = np.concatenate([A[:shift], A2*A1])
+            shift *= 2
+        x = np.minimum(A*self.x + B, C)
+
+        # Values of x before the clipping, from which the sensory
+        # inputs are computed as in update
+        x_prev = np.concatenate([self.x[None], x[:-1]])
+        x_free = x_prev + self.dt*(a*cpg0 - x_prev)
+        noise = self.draw_noise(n_steps)
+        s_t = self.touch_cont(x_free, limit) + self.Sigma_s_t*noise[..., 0]
+        contact = x_free > limit
+        s_p = np.where(contact, 0., a*cpg0 - x_free) \
+            + self.Sigma_s_p*noise[..., 1]
+
+        self.t += n_steps*self.dt
+        self.a[...] = a[-1]
+        self.cpg[...] = cpg[-1]
+        self.x[...] = x[-1]
+        self.s_p[...] = s_p[-1]
+        self.s_t[...] = s_t[-1]
+        self.effective_object_position = np.array(limit[-1])
+        return {"cpg": cpg, "x": x, "a": a, "s_p": s_p, "s_t": s_t}
+
+
+if __name__ == "__main__":
+    import numpy as np
+    import matplotlib.pyplot as plt
+
+    gp = GP(dt=0.005, omega2_GP=0.5, alpha=[1., 1.])
+
+    stime = 15000
+    data = gp.rollout(stime)["x"][:, 0]
+
+    # a batched rollout agrees with the update of each agent, also when
+    # the number of steps equals the number of agents
+    alpha = np.array([[1., 0.8], [0.5, 1.2], [0.9, 0.9]])
+    for n_steps in [len(alpha), 500]:
+        batch = GP(dt=0.005, alpha=alpha, n_agents=len(alpha))
+        batch.Sigma_s_p[...] = 0.
+        batch.effective_object_position[...] = 0.3
+        x = batch.rollout(n_steps)["x"]
+        for agent, agent_alpha in enumerate(alpha):
+            gp_agent = GP(dt=0.005, alpha=agent_alpha)
+            gp_agent.Sigma_s_p[...] = 0.
+            gp_agent.effective_object_position[...] = 0.3
+            x_agent = []
+            for t in range(n_steps):
+                gp_agent.update(0.)
+                x_agent.append(gp_agent.x.copy())
+            error = np.abs(np.array(x_agent) - x[:, agent]).max()
+            assert error < 1e-10, error
+    print("batched rollout agrees with the agents' updates")
+
+    plt.plot(data)
+    plt.show()
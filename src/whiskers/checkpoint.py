@@ -0,0 +1,140 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Snapshots of the state of a run (GP, GM and Sim, noise generators
+# included), from which the run can be resumed or branched (see
+# sweep.branch). A snapshot is a single .npz file: the arrays of the
+# state are stored as they are, the rest of the state as json.
+
+import numpy as np
+import json
+import os
+
+
+def flatten(state, prefix=""):
+    """
+    Split nested state dicts into arrays and json serializable values
+
+    Returns:
+        (arrays, values) tuple of flat dicts, keyed by the paths of the
+        entries ("gp/cpg", "gp/noise/buffer", ...)
+    """
+    arrays, values = {}, {}
+    for name, value in state.items():
+        key = prefix + name
+        if isinstance(value, dict):
+            a, v = flatten(value, key + "/")
+            arrays.update(a)
+            values.update(v)
+        elif isinstance(value, np.ndarray):
+            arrays[key] = value
+        else:
+            values[key] = value
+    return arrays, values
+
+
+def unflatten(entries):
+    state = {}
+    for key, value in entries.items():
+        node = state
+        *path, name = key.split("/")
+        for p in path:
+            node = node.setdefault(p, {})
+        node[name] = value
+    return state
+
+
+def save(path, gp, gm, sim, step, config=None):
+    """
+    Save the state of a run
+
+    Args:
+        path: str, .npz file
+        gp: GP, the generative process
+        gm: GM, the generative model
+        sim: Sim, the environment
+        step: int, the step the run resumes from
+        config: dict, configuration of the run
+    """
+    arrays, values = flatten({"gp": gp.get_state(), "gm": gm.get_state(),
+                              "sim": sim.get_state()})
+    meta = {"step": int(step), "config": config, "values": values}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, meta=json.dumps(meta, default=float), **arrays)
+    os.replace(tmp, path)
+
+
+def load(path):
+    """
+    Read a snapshot written by save
+
+    Returns:
+        dict, with the "step" to resume from, the "config" of the run
+        and the "gp", "gm" and "sim" states
+    """
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        entries = {key: data[key] for key in data.files if key != "meta"}
+    entries.update(meta["values"])
+    snapshot = unflatten(entries)
+    snapshot["step"] = meta["step"]
+    snapshot["config"] = meta["config"]
+    return snapshot
+
+
+def restore(snapshot, gp, gm, sim):
+    """
+    Bring gp, gm and sim to the state of a snapshot
+    """
+    gp.set_state(snapshot["gp"])
+    gm.set_state(snapshot["gm"])
+    sim.set_state(snapshot["sim"])
+
+
+if __name__ == "__main__":
+
+    # A run resumed from a checkpoint continues the uninterrupted one,
+    # and draws its frames at the same steps
+
+    import tempfile
+    from .runner import run_simulation
+    from .render import FrameRenderer
+
+    config = {"type": "normal", "stime": 2000, "seed": 0, "frames": 40}
+    full = run_simulation(config)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "half.npz")
+        run_simulation(dict(config, stop=1010, checkpoint=path))
+        resumed = run_simulation(dict(config, resume=path))
+    start = resumed["start"]
+    for name in ["x", "mu", "a", "nu", "collision"]:
+        assert np.array_equal(resumed[name], full[name][start:]), name
+    frames = full["frames"][full["frames"] >= start]
+    assert np.array_equal(start + resumed["frames"], frames)
+
+    # the simulation panel of the last frame is the same in both runs
+    panels = [FrameRenderer(traj, "normal").panels(len(traj["frames"]) - 1)
+              for traj in [full, resumed]]
+    assert np.array_equal(panels[0][0], panels[1][0])
+    print("resumed run renders as the uninterrupted one")
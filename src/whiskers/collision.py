@@ -0,0 +1,243 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Contacts of whiskers with polygonal objects. A whisker is a segment
+# of fixed length rotating about its base, and its contact limit is the
+# angle at which it first touches an object while sweeping from a start
+# angle. The whisker first touches a polygon either with its body, at a
+# vertex of the polygon, or with its tip, on an edge. So the candidate
+# angles are those of the vertices within reach and those of the
+# intersections of the edges with the circle drawn by the tip. All the
+# candidates of all the whiskers and objects are computed at once.
+#
+# Angles follow Sim: a whisker at angle theta points along
+# (-cos(theta), sin(theta)), and the angle grows as it moves up.
+
+import numpy as np
+
+
+def whisker_angle(origin, points):
+    """
+    Angles at which whiskers with bases origin point to points
+
+    Args:
+        origin: (..., 2) array, bases of the whiskers
+        points: (..., 2) array, points
+
+    Returns:
+        (...) array of angles in (-pi, pi]
+    """
+    rel = np.asarray(points) - origin
+    return np.arctan2(rel[..., 1], -rel[..., 0])
+
+
+class Scene:
+    """
+    A set of convex polygons, each moved by an offset, against which
+    the contacts of whiskers are found
+
+    Args:
+        polygons: list of (n_vertices, 2) arrays, the vertices of each
+                  object in order around it
+        cell: float, size of the cells of a uniform grid indexing the
+              objects (None to test the bounding box of each object
+              against each whisker, fine for a few objects)
+        moving: list of int, objects that move at most steps, which are
+                left out of the grid and always tested
+    """
+
+    def __init__(self, polygons, cell=None, moving=()):
+        n_vertices = max(len(p) for p in polygons)
+        # pad with copies of the last vertex, which add only zero
+        # length edges
+        self.vertices = np.array(
+            [np.vstack([p, np.repeat(np.asarray(p)[-1:],
+                                     n_vertices - len(p), axis=0)])
+             for p in polygons], dtype=float)
+        self.offsets = np.zeros((len(polygons), 2))
+        self.lower = self.vertices.min(axis=1)
+        self.upper = self.vertices.max(axis=1)
+        self.cell = cell
+        self.moving = np.zeros(len(polygons), dtype=bool)
+        self.moving[list(moving)] = True
+        self.index = None
+
+    def move(self, i, offset):
+        """
+        Place object i at offset from its initial position
+        """
+        self.offsets[i] = offset
+        if not self.moving[i]:
+            self.index = None
+
+    def build_index(self):
+        # (cell key, object) pairs of the grid of the still objects,
+        # sorted by key
+        still = np.flatnonzero(~self.moving)
+        lower = (self.lower + self.offsets)[still]
+        upper = (self.upper + self.offsets)[still]
+        self.origin = np.floor(lower.min(axis=0)/self.cell).astype(np.int64)
+        self.shape = np.floor(upper.max(axis=0)/self.cell).astype(
+            np.int64) - self.origin + 1
+        first, last = self.cells(lower, upper)
+        box, keys = self.expand(first, last)
+        order = np.argsort(keys, kind="stable")
+        self.index = (keys[order], still[box[order]])
+
+    def cells(self, lower, upper):
+        # ranges of the cells of the grid covered by the boxes
+        # lower-upper (cells outside the grid hold no object)
+        first = np.floor(lower/self.cell).astype(np.int64) - self.origin
+        last = np.floor(upper/self.cell).astype(np.int64) - self.origin
+        return (np.clip(first, 0, self.shape - 1),
+                np.clip(last, 0, self.shape - 1))
+
+    def expand(self, first, last):
+        # one (box, cell key) pair for each cell covered by each box
+        size = last - first + 1
+        count = size[:, 0]*size[:, 1]
+        box = np.repeat(np.arange(len(first)), count)
+        local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count,
+                                                   count)
+        col = first[box, 0] + local % size[box, 0]
+        row = first[box, 1] + local // size[box, 0]
+        return box, row*self.shape[0] + col
+
+    def overlap(self, lower, upper, whiskers, objects):
+        # which pairs of whiskers and objects have overlapping boxes
+        return np.all(
+            (lower[whiskers] <= (self.upper + self.offsets)[objects])
+            & (upper[whiskers] >= (self.lower + self.offsets)[objects]),
+            axis=-1)
+
+    def candidates(self, lower, upper):
+        """
+        Pairs of whiskers and objects whose bounding boxes overlap
+
+        Args:
+            lower: (n_whiskers, 2) array, lower corners of the boxes
+                   reached by the whiskers
+            upper: (n_whiskers, 2) array, upper corners
+
+        Returns:
+            (whiskers, objects) tuple of int arrays
+        """
+        if self.cell is None or self.moving.all():
+            whiskers, objects = np.nonzero(np.all(
+                (lower[:, None] <= self.upper + self.offsets)
+                & (upper[:, None] >= self.lower + self.offsets), axis=-1))
+            return whiskers, objects
+
+        # look the cells covered by each whisker up in the grid
+        if self.index is None:
+            self.build_index()
+        keys, objects = self.index
+        whiskers, query = self.expand(*self.cells(lower, upper))
+        left = np.searchsorted(keys, query, side="left")
+        count = np.searchsorted(keys, query, side="right") - left
+        found = np.repeat(left, count) + np.arange(count.sum()) \
+            - np.repeat(np.cumsum(count) - count, count)
+        n_objects = len(self.vertices)
+        pairs = np.unique(np.repeat(whiskers, count)*n_objects
+                          + objects[found])
+
+        # plus the moving objects, then check the bounding boxes
+        moving = np.flatnonzero(self.moving)
+        pairs = np.concatenate([
+            pairs, (np.arange(len(lower))[:, None]*n_objects
+                    + moving).ravel()])
+        whiskers, objects = np.divmod(pairs, n_objects)
+        keep = self.overlap(lower, upper, whiskers, objects)
+        return whiskers[keep], objects[keep]
+
+    def contacts(self, base, length, start, sweep=np.pi):
+        """
+        First contacts of whiskers rotating from the start angles
+
+        Args:
+            base: (n_whiskers, 2) or (2,) array, bases of the whiskers
+            length: (n_whiskers,) array or float, their lengths
+            start: (n_whiskers,) array or float, angles the sweeps start
+                   from
+            sweep: float, width of the sweeps
+
+        Returns:
+            (contact, angle, obj) tuple of (n_whiskers,) arrays (or
+            scalars for a single whisker): whether the whisker touches
+            an object within the sweep, the angle of the first contact
+            (nan if none) and the index of the object (-1 if none)
+        """
+        shape = np.shape(length)
+        base = np.reshape(base, (-1, 2)).astype(float)
+        length = np.broadcast_to(length, len(base)).astype(float)
+        start = np.broadcast_to(start, len(base)).astype(float)
+
+        whiskers, objects = self.candidates(base - length[:, None],
+                                            base + length[:, None])
+        # vertices relative to the bases, (n_pairs, n_vertices, 2)
+        rel = self.vertices[objects] + self.offsets[objects, None] \
+            - base[whiskers, None]
+        r2 = length[whiskers, None]**2
+
+        # body contacts, at the vertices within reach
+        d2 = np.sum(rel**2, axis=-1)
+        pair, vertex = np.nonzero(d2 <= r2)
+        pairs = [pair]
+        points = [rel[pair, vertex]]
+
+        # tip contacts, where the edges cross the circle of the tip
+        edge = np.roll(rel, -1, axis=1) - rel
+        a = np.sum(edge**2, axis=-1)
+        b = 2*np.sum(rel*edge, axis=-1)
+        disc = b**2 - 4*a*(d2 - r2)
+        pair, vertex = np.nonzero((a > 0) & (disc >= 0))
+        a, b, root = a[pair, vertex], b[pair, vertex], \
+            np.sqrt(disc[pair, vertex])
+        for sign in [-1, 1]:
+            s = (-b + sign*root)/(2*a)
+            valid = (s >= 0) & (s <= 1)
+            pairs.append(pair[valid])
+            points.append(rel[pair[valid], vertex[valid]]
+                          + s[valid, None]*edge[pair[valid], vertex[valid]])
+
+        # angles swept from the start to reach each point
+        pair = np.concatenate(pairs)
+        points = np.concatenate(points)
+        swept = np.mod(np.arctan2(points[:, 1], -points[:, 0])
+                       - start[whiskers[pair]], 2*np.pi)
+        within = swept <= sweep
+        pair, swept = pair[within], swept[within]
+
+        # first contact of each whisker over all its objects
+        whisker = whiskers[pair]
+        first = np.full(len(base), np.inf)
+        np.minimum.at(first, whisker, swept)
+        obj = np.full(len(base), -1)
+        hit = swept == first[whisker]
+        obj[whisker[hit]] = objects[pair[hit]]
+
+        contact = np.isfinite(first)
+        angle = np.where(contact, start + first, np.nan)
+        if shape == ():
+            return bool(contact[0]), angle[0], int(obj[0])
+        return contact, angle, obj
@@ -0,0 +1,122 @@
+from .runner import make_config, run_simulation
+from .profiling import PhaseTimer, profile, add_startup_option
+from .sim import Sim, WhiskerPad
+import numpy as np
+import contextlib
+import argparse
+
+
+def main(argv=None):
+    """
+    Run the demo, and draw its frames unless --headless
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--type",
+                        default="still",
+                        help="type of demo. one of 'still', 'normal', ''large")
+    parser.add_argument("-w", "--whiskers", type=int, default=None,
+                        help="simulate a pad of this many whiskers, all "
+                        "coupled to the model (the plots show the first one)")
+    parser.add_argument("--contact", default="box",
+                        help="'box' for the contact limits of the demo, "
+                        "'polygon' for the first contacts with the box "
+                        "polygon")
+    parser.add_argument("--integrator", default="euler",
+                        help="stepping of the model, 'euler' or 'implicit'")
+    parser.add_argument("--backend", default="python",
+                        help="'python', or 'numba' for the compiled loop, "
+                        "which needs --touch-tol")
+    parser.add_argument("--touch-tol", type=float, default=None,
+                        help="read the touch functions from tables with "
+                        "this error, as the numba backend does, so that "
+                        "both backends give the same run")
+    parser.add_argument("--converge", default=None,
+                        help="once the model has converged, 'stop' the run "
+                        "or 'skip' the steps until the box moves")
+    parser.add_argument("--headless", action="store_true",
+                        help="only simulate, do not draw any frame")
+    parser.add_argument("-o", "--output", default=None,
+                        help="save the trajectories to this .npz file")
+    parser.add_argument("--live", action="store_true",
+                        help="show the frames on screen instead of saving "
+                        "them")
+    parser.add_argument("--stream", action="store_true",
+                        help="append frames to the gif videos as they are "
+                        "drawn instead of saving them as images")
+    parser.add_argument("--record", default=None,
+                        help="write the trajectories chunk by chunk to this "
+                        "folder instead of keeping them in memory")
+    parser.add_argument("--timings", default=None,
+                        help="time the phases of the simulation and of the "
+                        "drawing, and save the totals to this .json or .csv "
+                        "file")
+    parser.add_argument("--profile", nargs="?", const="", default=None,
+                        help="profile the whole demo, optionally saving the "
+                        "profile to this file")
+    add_startup_option(parser, "whiskers.demo")
+    parser.add_argument("--sampler", default="cprofile",
+                        help="profiler used by --profile, 'cprofile' or "
+                        "'pyinstrument'")
+    args = parser.parse_args(argv)
+    type = args.type
+
+    timer = PhaseTimer() if args.timings is not None else None
+    profiling = contextlib.ExitStack()
+    if args.profile is not None:
+        profiling.enter_context(profile(args.profile or None, args.sampler))
+
+    print("simulating", type, "...")
+
+    config = make_config(type=type, record=args.record,
+                         whiskers=args.whiskers, contact=args.contact,
+                         integrator=args.integrator,
+                         converge=args.converge, backend=args.backend,
+                         touch_tol=args.touch_tol)
+    stime = config["stime"]
+    traj = run_simulation(config, timer=timer)
+    if "converge" in traj:
+        print("converged at", traj["converge"]["converged_at"],
+              "skipped", traj["converge"]["skipped"], "steps")
+
+    if args.output is not None:
+        np.savez(args.output, **traj)
+
+    if not args.headless:
+
+        from .plotter import Plotter
+        import matplotlib.pyplot as plt
+
+        if args.whiskers is None:
+            sim = Sim("demo_" + type, type, stime, contact=args.contact)
+            whiskers = 0
+        else:
+            sim = WhiskerPad("demo_" + type, type, stime, args.whiskers,
+                             contact=args.contact)
+            whiskers = slice(None)
+        plotter = Plotter(sim, stime, type, save=not args.live,
+                          blit=args.live, stream=args.stream, timer=timer)
+        if args.live:
+            plt.show(block=False)
+
+        for frame, t in enumerate(traj["frames"]):
+
+            print(frame)
+            sim.move_box(traj["start"] + t)
+            sim.update(traj["x"][t, whiskers], traj["mu"][t, whiskers])
+            plotter.replay(t, traj)
+            with plotter.timer("draw"):
+                plotter.draw()
+
+        if not args.live:
+            plotter.close()
+        if args.live:
+            plt.show()
+
+    profiling.close()
+    if timer is not None:
+        timer.report()
+        timer.dump(args.timings)
+
+
+if __name__ == "__main__":
+    main()
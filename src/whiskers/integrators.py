@@ -0,0 +1,135 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Accuracy reference of the integration of the Sim/GP/GM loop.
+# GP.update and GM.update take forward Euler steps of a continuous
+# system. The reference takes the same steps, without noise, at a
+# fraction of dt, and the integrators of run_simulation (config
+# "integrator": "euler", or "implicit" for the linearized implicit step
+# of the GM) are measured against it. Explicit higher order methods do not
+# pay off here: the gradient flow of the GM is stiff, so their step is
+# bounded by stability rather than accuracy, and they need more
+# evaluations than Euler at a fine step for the same error.
+
+import numpy as np
+
+
+def euler_reference(gp, gm, limits, dt, t_eval, factor=10):
+    """
+    Integrate the noise-free loop with the steps of GP.update and
+    GM.update (Euler steps, or the implicit steps of a GM built with
+    integrator="implicit"), at a step dt/factor. With factor=1 this is
+    the loop of run_simulation without noise.
+
+    Args:
+        gp: GP, single agent generative process in its initial state
+        gm: GM, single agent generative model in its initial state
+        limits: array, angular limit of the object at each step of dt
+        dt: float, step of limits
+        t_eval: array, times at which the state is stored, multiples of
+                dt/factor
+        factor: int, number of steps per step of dt
+
+    Returns:
+        dict, the state variables at the times t_eval, and the number
+        of steps "n_steps"
+    """
+    h = dt/factor
+    gp.dt = gm.dt = h
+    gp.Sigma_s_p[:] = 0.
+    gp.Sigma_s_t[:] = 0.
+    limit_times = (np.arange(len(limits)) + 1)*dt
+    stored = np.round(np.asarray(t_eval)/h).astype(int)
+    n_steps = stored[-1]
+
+    names = ["cpg", "x", "a", "mu", "dmu", "nu"]
+    out = {name: [] for name in names}
+    delta_action = np.zeros(len(gp.a))
+    j = 0
+    for k in range(1, n_steps + 1):
+        gp.effective_object_position[0] = np.interp(k*h, limit_times, limits)
+        gp.update(delta_action)
+        delta_action = gm.update(gp.s_t[0], gp.s_p[0], gp.cpg[0])
+        while j < len(stored) and stored[j] == k:
+            for name in names:
+                obj = gm if name in ["mu", "dmu", "nu"] else gp
+                out[name].append(getattr(obj, name).copy())
+            j += 1
+
+    result = {name: np.array(values) for name, values in out.items()}
+    result["n_steps"] = n_steps
+    return result
+
+
+if __name__ == "__main__":
+
+    # Accuracy and cost of the integrators of run_simulation against the
+    # Euler loop at a step dt/factor. The object limits are those of a
+    # run of the demo. The precisions of the sensory and internal errors
+    # alone give the GM an eigenvalue of -200, which puts the Euler step
+    # of dt=0.01 at its stability limit.
+
+    import argparse
+    import time
+    from .runner import make_config, build, run_simulation
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--type", default="still",
+                        help="type of demo. one of 'still', 'normal', ''large")
+    parser.add_argument("--stime", type=int, default=2000,
+                        help="number of steps of size dt")
+    parser.add_argument("--factor", type=int, default=256,
+                        help="refinement of the Euler reference")
+    parser.add_argument("--sample", type=int, default=10,
+                        help="steps between stored states")
+    args = parser.parse_args()
+
+    config = make_config(type=args.type, stime=args.stime, seed=0)
+    dt = config["dt"]
+    limits = run_simulation(config)["angle_limit"]
+    t_eval = np.arange(args.sample, args.stime + 1, args.sample)*dt
+
+    def fresh(integrator):
+        gp, gm, _ = build(dict(config, integrator=integrator))
+        return gp, gm
+
+    start = time.perf_counter()
+    reference = euler_reference(*fresh("euler"), limits, dt, t_eval,
+                                args.factor)
+    print("reference: Euler at dt/%d, %d steps, %.1fs" % (
+        args.factor, reference["n_steps"], time.perf_counter() - start))
+
+    print("%-16s %9s %9s %9s %9s %9s %8s" % (
+        "integrator", "steps", "err x", "err a", "err mu", "err nu",
+        "time"))
+    for integrator in ["euler", "implicit"]:
+        for factor in [1, 4, 16]:
+            start = time.perf_counter()
+            result = euler_reference(*fresh(integrator), limits, dt,
+                                     t_eval, factor)
+            elapsed = time.perf_counter() - start
+            errors = [np.abs(result[k][:, 0] - reference[k][:, 0]).max()
+                      for k in ["x", "a", "mu", "nu"]]
+            print("%-16s %9d %9.2e %9.2e %9.2e %9.2e %7.1fs" % (
+                "%s dt/%d" % (integrator, factor), result["n_steps"],
+                *errors, elapsed))
@@ -0,0 +1,283 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Fused rollout of the coupled Sim/GP/GM loop of runner.run_simulation.
+# The whole loop is a single function over plain arrays and floats,
+# compiled with numba when it is installed. All the noise is drawn
+# before the rollout from the rng of the GP, in the same order the
+# GP would draw it, and the arithmetic follows GP.update and GM.update
+# operation by operation, so for a fixed seed the kernel reproduces
+# the python path bit for bit. Compiled, it evaluates tanh and cosh
+# with libm, which differs from numpy in the last bit, so it runs only
+# with the touch functions read from tables (see lut.py), as the
+# python path then does too.
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def wrap(f):
+            return f
+        return wrap
+
+
+@njit(cache=True)
+def _lookup(u, table):
+    # lut.SaturatingTable.lookup of a single value
+    start, scale, values, slopes = table
+    f = (u - start)*scale
+    if f < 0.:
+        f = 0.
+    if f > values.shape[0] - 1:
+        f = values.shape[0] - 1
+    k = int(f)
+    return values[k] + (f - k)*slopes[k]
+
+
+@njit(cache=True)
+def _rollout(stime, dt, omega2, box_vertex, is_frame,
+             whisker_base, whisker_len, whisker_base_angle, ampl_scale,
+             tip_x, gp_sigma_s_p, gp_sigma_s_t, noise,
+             eta, eta_d, eta_a, eta_nu, sigma_mu, sigma_s_p, sigma_s_t,
+             gp_tables, gp_tanh, gm_tables, gm_tanh, gm_sech,
+             cpg, x, a, s_p, s_t, eop, mu, dmu, nu, da,
+             out_cpg, out_x, out_a, out_s_p, out_s_t, out_mu, out_dmu,
+             out_nu, out_touch_pred, out_pe_mu, out_pe_s_p, out_pe_s_t,
+             out_da, out_collision, out_angle_limit):
+
+    n_gp = x.shape[0]
+    n_gm = mu.shape[0]
+    whisker_head = whisker_base[1] + whisker_len
+
+    for t in range(stime):
+
+        # --- Sim.move_box / Sim.detect_collision
+        box_x = box_vertex[t, 0]
+        box_height = box_vertex[t, 1]
+        collision = False
+        curr_angle_limit = np.pi
+        if box_height < whisker_head:
+            if box_x - 0.1 > tip_x:
+                angle = 0.
+                ddx = box_x - whisker_base[0]
+                ddy = box_height - whisker_base[1]
+                if np.abs(ddx) > 1e-30:
+                    angle = np.arctan(ddy/ddx)
+                curr_angle_limit = np.abs(angle + whisker_base_angle)
+            else:
+                angle = -np.arcsin(
+                    (box_height - 0.1 - whisker_base[1]) / whisker_len)
+                curr_angle_limit = np.abs(angle + whisker_base_angle)
+            collision = True
+
+        # --- GP.update
+        eop[0] = curr_angle_limit
+        cpg[0] += dt*(cpg[1])
+        cpg[1] += -dt*(omega2*cpg[0])
+        for i in range(n_gp):
+            a[i] += da[i]
+            x[i] += dt*(a[i]*cpg[0] - x[i])
+            if gp_tables:
+                tanh_x = _lookup(100*(x[i] - eop[i]), gp_tanh)
+            else:
+                tanh_x = np.tanh(100*(x[i] - eop[i]))
+            s_t[i] = 0.5 * (tanh_x + 1) \
+                + gp_sigma_s_t[i]*noise[t, i, 0]
+            if x[i] > eop[i]:
+                s_p[i] = 0.
+                x[i] = eop[i]
+            else:
+                s_p[i] = a[i]*cpg[0] - x[i]
+            s_p[i] += gp_sigma_s_p[i]*noise[t, i, 1]
+
+        # --- GM.update, driven by the first whisker of the GP
+        xc = cpg[0]
+        for i in range(n_gm):
+            # GM.touch_terms
+            if gm_tables:
+                sv = _lookup(50*dmu[i], gm_sech)
+                dsv = -50*sv
+                tv = _lookup(50*dmu[i], gm_tanh)
+                tx = _lookup(50*mu[i], gm_tanh)
+                sx = _lookup(50*mu[i], gm_sech)
+            else:
+                cv = np.cosh(50*dmu[i])
+                sv = 1/cv
+                dsv = -50*1/cv
+                tv = np.tanh(50*dmu[i])
+                tx = np.tanh(50*mu[i])
+                sx = 1/np.cosh(50*mu[i])
+            h = 0.5*tx + 0.5
+            touch_pred = sv*h
+            dg_dv = dsv*tv*h
+            dg_dx = sv*0.5*50*sx**2
+
+            pe_mu = dmu[i] - (nu[i]*xc - mu[i])
+            pe_s_p = s_p[0] - dmu[i]
+            pe_s_t = s_t[0] - touch_pred
+
+            df_dmu = pe_mu/sigma_mu[i] - dg_dx*pe_s_t/sigma_s_t[i]
+            df_d_dmu = pe_mu/sigma_mu[i] - pe_s_p/sigma_s_p[i] \
+                - dg_dv*pe_s_t/sigma_s_t[i]
+
+            da[i] = -dt*eta_a*(xc*pe_s_p/sigma_s_p[i]
+                               + pe_s_t/sigma_s_t[i])
+            nu[i] += -dt*eta_nu*(-xc*pe_mu/sigma_mu[i])
+            mu[i] += dt*(dmu[i] - eta*df_dmu)
+            dmu[i] += -dt*eta_d*df_d_dmu
+
+            out_touch_pred[t, i] = touch_pred
+            out_pe_mu[t, i] = pe_mu
+            out_pe_s_p[t, i] = pe_s_p
+            out_pe_s_t[t, i] = pe_s_t
+
+        # --- store state
+        out_cpg[t] = cpg
+        out_x[t] = x
+        out_a[t] = a
+        out_s_p[t] = s_p
+        out_s_t[t] = s_t
+        out_mu[t] = mu
+        out_dmu[t] = dmu
+        out_nu[t] = nu
+        out_da[t] = da
+        out_collision[t] = collision
+        out_angle_limit[t] = curr_angle_limit
+
+        # --- Sim.update, whisker geometry refreshed at frame steps
+        if is_frame[t]:
+            angle = ampl_scale*x[0]*np.pi + whisker_base_angle
+            tip_x = whisker_base[0] + np.cos(np.pi - angle)*whisker_len
+
+
+def _tables(table):
+    # tanh and sech tables as read by _lookup (empty without a table)
+    if table is None:
+        empty = np.zeros(1)
+        return (0., 1., empty, empty), (0., 1., empty, empty)
+    start, scale, tanh_values, tanh_slopes, sech_values, sech_slopes = \
+        table.arrays()
+    return ((start, scale, tanh_values, tanh_slopes),
+            (start, scale, sech_values, sech_slopes))
+
+
+def rollout(gp, gm, sim, stime, is_frame, traj, start=0):
+    """
+    Run the coupled loop of runner.run_simulation in a single call of
+    the compiled kernel. gp, gm and sim are left in their final state,
+    so a run can be split into successive rollouts.
+
+    Args:
+        gp: GP, single agent generative process
+        gm: GM, single agent generative model
+        sim: Sim, the environment
+        stime: int, number of steps
+        is_frame: bool array, steps at which the whisker geometry of
+                  sim is refreshed
+        traj: dict, preallocated arrays (see runner.allocate)
+        start: int, step of the environment at which the rollout starts
+    """
+    if HAVE_NUMBA and not (gp.tabulated and gm.tabulated):
+        # the compiled tanh and cosh are not numpy's
+        raise ValueError("the compiled kernel follows the python path only "
+                         "with tabulated touch functions (touch_tol)")
+    box_vertex = sim.schedule(start, start + stime)["box_vertex"]
+    noise = gp.draw_noise(stime)
+    gp_tanh, _ = _tables(gp.touch_table)
+    gm_tanh, gm_sech = _tables(gm.touch_table)
+    da = np.broadcast_to(np.asarray(gm.da, dtype=float),
+                         gm.nu.shape).copy()
+    _rollout(
+        stime, float(gp.dt), float(gp.omega2), box_vertex, is_frame,
+        sim.whisker_base.astype(float), float(sim.whisker_len),
+        float(sim.whisker_base_angle), float(sim.whisker_angle_ampl_scale),
+        float(sim.whisker_vertices[1][0]), gp.Sigma_s_p, gp.Sigma_s_t,
+        noise, float(gm.eta), float(gm.eta_d), float(gm.eta_a),
+        float(gm.eta_nu), gm.Sigma_mu, gm.Sigma_s_p, gm.Sigma_s_t,
+        gp.tabulated, gp_tanh,
+        gm.tabulated, gm_tanh, gm_sech,
+        gp.cpg, gp.x, gp.a, gp.s_p, gp.s_t, gp.effective_object_position,
+        gm.mu, gm.dmu, gm.nu, da,
+        traj["cpg"], traj["x"], traj["a"], traj["s_p"], traj["s_t"],
+        traj["mu"], traj["dmu"], traj["nu"], traj["touch_pred"],
+        traj["PE_mu"], traj["PE_s_p"], traj["PE_s_t"], traj["da"],
+        traj["collision"], traj["angle_limit"])
+
+    # bring the objects to the final state of the rollout
+    gp.t += stime*gp.dt
+    gm.da = da
+    for name in ["touch_pred", "PE_mu", "PE_s_p", "PE_s_t"]:
+        setattr(gm, name, traj[name][-1].copy())
+    if gm.stats is not None:
+        # nu follows the amplitude of the first whisker, as in the loop
+        gm.stats.update(traj["PE_mu"], traj["PE_s_p"], traj["PE_s_t"],
+                        traj["nu"], (gm.Sigma_mu, gm.Sigma_s_p,
+                                     gm.Sigma_s_t),
+                        target=traj["a"][:, :1])
+    if stime > 0:
+        # the schedule above filled the tables of these steps
+        sim.place_box(start + stime - 1)
+    frames = np.flatnonzero(is_frame)
+    if len(frames) > 0:
+        sim.update(traj["x"][frames[-1], 0], traj["mu"][frames[-1], 0])
+
+
+if __name__ == "__main__":
+
+    # Benchmark: steps per second of the python and compiled paths
+
+    import time
+    from .runner import run_simulation
+
+    stime = 20000
+    touch_tol = 1e-6
+    runs = [("python", None), ("python", touch_tol)]
+    if HAVE_NUMBA:
+        runs.append(("numba", touch_tol))
+        # compile once outside the measures
+        run_simulation({"stime": 200, "seed": 0, "backend": "numba",
+                        "touch_tol": touch_tol})
+
+    results = {}
+    for backend, tol in runs:
+        start = time.perf_counter()
+        results[backend, tol] = run_simulation(
+            {"stime": stime, "seed": 0, "backend": backend,
+             "touch_tol": tol})
+        elapsed = time.perf_counter() - start
+        print("%-8s touch_tol %-6s %12.0f steps/s" % (backend, tol,
+                                                      stime/elapsed))
+
+    if HAVE_NUMBA:
+        # with the same tables the two paths give the same trajectories
+        err = max(np.abs(results["python", touch_tol][k]
+                         - results["numba", touch_tol][k]).max()
+                  for k in ["x", "a", "mu", "dmu", "nu"])
+        print("largest difference of the python and numba paths: %g" % err)
+    else:
+        print("numba is not installed, only the python path was measured")
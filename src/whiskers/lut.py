@@ -0,0 +1,111 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Tables of the saturating curves of the touch functions of GP and GM,
+# evaluated by linear interpolation on a uniform grid. Compiled code
+# (see kernel.py) reads them several times faster than it evaluates
+# tanh and cosh; numpy has vectorized tanh and cosh that are faster
+# than any table lookup (by about 15 times), so GP and GM read the
+# tables only when asked to (tabulated), to run the same model as the
+# compiled path.
+
+import functools
+import numpy as np
+
+
+class SaturatingTable:
+    """
+    Tables of tanh and sech within a given absolute error
+
+    Args:
+        tol: float, bound of the error of the interpolated values
+    """
+
+    def __init__(self, tol):
+        self.tol = tol
+        # linear interpolation errs by at most step**2/8*max|f''|, and
+        # |f''| <= 1 for both curves
+        self.step = np.sqrt(8*tol)
+        # beyond +-bound both curves are within tol of their asymptotes
+        bound = np.arccosh(1/tol)
+        n = int(np.ceil(2*bound/self.step)) + 1
+        grid = -bound + self.step*np.arange(n)
+        self.start = grid[0]
+        self.scale = 1/self.step
+        # values at the nodes and slopes to the next node (zero after
+        # the last one, where lookups are clamped)
+        self.tanh_values = np.tanh(grid)
+        self.tanh_slopes = np.append(np.diff(self.tanh_values), 0.)
+        self.sech_values = 1/np.cosh(grid)
+        self.sech_slopes = np.append(np.diff(self.sech_values), 0.)
+
+    def lookup(self, u, values, slopes):
+        f = np.clip((np.asarray(u) - self.start)*self.scale,
+                    0, len(values) - 1)
+        k = f.astype(np.intp)
+        return values[k] + (f - k)*slopes[k]
+
+    def tanh(self, u):
+        return self.lookup(u, self.tanh_values, self.tanh_slopes)
+
+    def sech(self, u):
+        return self.lookup(u, self.sech_values, self.sech_slopes)
+
+    def arrays(self):
+        """
+        The tables as a tuple of floats and arrays, as read by the
+        compiled kernel
+        """
+        return (float(self.start), float(self.scale),
+                self.tanh_values, self.tanh_slopes,
+                self.sech_values, self.sech_slopes)
+
+
+if __name__ == "__main__":
+
+    # Error of the tables and cost of a lookup against numpy
+
+    import timeit
+
+    u = np.linspace(-40, 40, 1000001)
+    for tol in [1e-4, 1e-6, 1e-8]:
+        table = SaturatingTable(tol)
+        err_tanh = np.abs(table.tanh(u) - np.tanh(u)).max()
+        err_sech = np.abs(table.sech(u) - 1/np.cosh(u)).max()
+        print("tol %g: %d nodes, max error tanh %.2g sech %.2g" %
+              (tol, len(table.tanh_values), err_tanh, err_sech))
+
+    u = np.random.RandomState(0).randn(4096)*2
+    for name, f in [("np.tanh", lambda: np.tanh(u)),
+                    ("table.tanh", lambda: table.tanh(u))]:
+        t = min(timeit.repeat(f, number=1000, repeat=3))/1000
+        print("%-10s %8.2f us per 4096 values" % (name, t*1e6))
+
+
+@functools.lru_cache(maxsize=None)
+def shared_table(tol):
+    """
+    SaturatingTable of a given error, built once and then shared by all
+    the models that read it (the tables are never written)
+    """
+    return SaturatingTable(tol)
@@ -0,0 +1,306 @@
+# Copyright (c) 2021 Francesco Mannella
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# matplotlib and PIL are imported by the functions that use them, so
+# that importing the writers costs no more than numpy.
+
+import numpy as np
+import functools
+import os
+import glob
+import shutil
+import subprocess
+
+
+class vidManager:
+    """
+    Collects images and make a gif video
+    """
+
+    def __init__(self, fig, name="vid", dirname="frames", duration=300,
+                 stream=False, fmt="gif"):
+        """
+        Args:
+            fig: matplotlib.pyplot.figure, figure object where to draw images
+            name: str, root name of the images the giv video will be <name>.gif
+            dirname: str, the name of the folder in which images and the video will be saved
+            duration: int or tuple, The display duration of each frame of the multiframe
+                      gif, in milliseconds. Pass a single integer for a constant
+                      duration, or a list or tuple to set the duration for each
+                      frame separately.
+            stream: bool, if True frames are not saved as images but taken
+                    from the canvas buffer and appended to the video as they
+                    come (duration must then be a single number)
+            fmt: str, extension of the video when streaming ("gif", or a
+                 format ffmpeg knows, e.g. "mp4")
+        """
+        self.name = name
+        self.fig = fig
+        self.dir = dirname
+        self.duration = duration
+        self.stream = stream
+        self.fmt = fmt
+        self.writer = None
+        if stream:
+            self.t = 0
+        else:
+            self.clear()
+
+    def clear(self):
+        """
+        Clear all stuff within the folder (create it if needed)
+        """
+        self.t = 0
+        if not os.path.exists(self.dir):
+            os.makedirs(self.dir)
+        files = glob.glob(self.dir + os.sep + "*.png")
+        for f in files:
+            if(os.path.isfile(f)):
+                os.remove(f)
+
+    def save_frame(self):
+        """
+        Save a single frame as an image, or append it to the video
+        when streaming
+        """
+
+        self.fig.canvas.draw()
+        if self.stream:
+            if self.writer is None:
+                os.makedirs(self.dir, exist_ok=True)
+                self.writer = open_writer(
+                    self.dir + os.sep + self.name + "." + self.fmt,
+                    duration=self.duration)
+            # a view on the rgba buffer of the canvas, no copy
+            self.writer.append(np.asarray(self.fig.canvas.buffer_rgba()))
+        else:
+            self.fig.savefig(self.dir + os.sep + self.name + "%08d.png" % self.t)
+        self.t += 1
+
+    def mk_video(self):
+        """
+        Make a gif file from saved frames. the gif file will be in
+        <self.dir>/<self.name>.gif. When streaming, close the video.
+        """
+        if self.stream:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            return
+
+        from PIL import Image
+
+        # Create the frames
+        frames = []
+        imgs = glob.glob(self.dir + os.sep + self.name + "*.png")
+        for i in sorted(imgs):
+            new_frame = Image.open(i)
+            frames.append(new_frame)
+
+        # Save into a GIF file that loops forever
+        frames[0].save(self.dir + os.sep + self.name + '.gif',
+                       format='GIF',
+                       append_images=frames[1:],
+                       save_all=True,
+                       duration=self.duration, loop=0)
+
+
+def encode_gif(frame, first=True, duration=100, loop=0):
+    """
+    Quantize a frame to 256 colors and encode it into gif blocks. This is
+    the costly part of GifWriter.append, and needs no file, so it can run
+    in the process that draws the frame.
+
+    Args:
+        frame: uint8 array of shape (height, width, 3 or 4)
+        first: bool, also encode the header of a gif starting with
+               this frame
+        duration: int, display duration of the frame in milliseconds
+        loop: int, number of loops (0 loops forever)
+
+    Returns:
+        (header, data) tuple of bytes, the header (empty if not first)
+        and the frame with its own palette
+    """
+    from PIL import Image, GifImagePlugin
+    image = Image.fromarray(np.ascontiguousarray(frame[..., :3]))
+    image = image.quantize(256)
+    header = b""
+    if first:
+        chunks, _ = GifImagePlugin.getheader(image.copy(),
+                                             info={"loop": loop})
+        header = b"".join(chunks)
+    data = b"".join(GifImagePlugin.getdata(image, duration=duration,
+                                           include_color_table=True))
+    return header, data
+
+
+def encode_raw(frame, first=True):
+    """
+    The rgb bytes of a frame, as piped by FFmpegWriter (first is
+    unused, a video has no header of its own)
+
+    Returns:
+        ((height, width), data) tuple
+    """
+    frame = np.ascontiguousarray(frame[..., :3])
+    return frame.shape[:2], frame.tobytes()
+
+
+class GifWriter:
+    """
+    Writes a gif file one frame at a time, so that frames never need to
+    be kept all in memory
+    """
+
+    def __init__(self, path, duration=100, loop=0):
+        """
+        Args:
+            path: str, the gif file
+            duration: int, display duration of each frame in milliseconds
+            loop: int, number of loops (0 loops forever)
+        """
+        self.file = open(path, "wb")
+        self.duration = duration
+        self.loop = loop
+        self.n_frames = 0
+
+    def encoder(self):
+        """
+        The function encoding the frames for write, called as
+        encoder(frame, first) (see encode_gif)
+        """
+        return functools.partial(encode_gif, duration=self.duration,
+                                 loop=self.loop)
+
+    def append(self, frame):
+        """
+        Quantize a frame to 256 colors and append it
+
+        Args:
+            frame: uint8 array of shape (height, width, 3 or 4)
+        """
+        self.write(self.encoder()(frame, self.n_frames == 0))
+
+    def write(self, encoded):
+        """
+        Append a frame encoded by the encoder, the first frame with its
+        header
+        """
+        header, data = encoded
+        if self.n_frames == 0:
+            self.file.write(header)
+        # each frame carries its own palette
+        self.file.write(data)
+        self.n_frames += 1
+
+    def close(self):
+        self.file.write(b";")
+        self.file.close()
+
+
+class FFmpegWriter:
+    """
+    Pipes frames into an ffmpeg process encoding a video file
+    """
+
+    def __init__(self, path, duration=100):
+        """
+        Args:
+            path: str, the video file (format given by its extension)
+            duration: int, display duration of each frame in milliseconds
+        """
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg is needed to write " + path)
+        self.path = path
+        self.fps = 1000./duration
+        self.proc = None
+
+    def encoder(self):
+        """
+        The function encoding the frames for write (see encode_raw)
+        """
+        return encode_raw
+
+    def append(self, frame):
+        """
+        Args:
+            frame: uint8 array of shape (height, width, 3 or 4)
+        """
+        self.write(encode_raw(frame))
+
+    def write(self, encoded):
+        """
+        Pipe a frame encoded by the encoder
+        """
+        (height, width), data = encoded
+        if self.proc is None:
+            self.proc = subprocess.Popen(
+                ["ffmpeg", "-loglevel", "error", "-y",
+                 "-f", "rawvideo", "-pix_fmt", "rgb24",
+                 "-s", "%dx%d" % (width, height), "-r", str(self.fps),
+                 "-i", "-",
+                 "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                 "-pix_fmt", "yuv420p", self.path],
+                stdin=subprocess.PIPE)
+        self.proc.stdin.write(data)
+
+    def close(self):
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+
+def open_writer(path, duration=100):
+    """
+    A streaming writer for path: a GifWriter for .gif files, an
+    FFmpegWriter otherwise
+    """
+    if path.lower().endswith(".gif"):
+        return GifWriter(path, duration=duration)
+    return FFmpegWriter(path, duration=duration)
+
+
+if __name__ == "__main__":
+
+    import matplotlib.pyplot as plt
+
+    # USAGE
+
+    # prepare graphics
+    fig = plt.Figure()
+    ax = fig.add_subplot(111)
+    pnt = ax.scatter(0, 0, s=100, color="red")
+    ax.set_xlim([0, 1])
+    ax.set_ylim([0, 1])
+
+    # init video maker
+    vm = vidManager(fig, "fooname", "foodir")
+
+    for p in np.linspace(0, 1, 30):
+
+        # update fig
+        pnt.set_offsets([p, p])
+        vm.save_frame()
+
+    vm.mk_video()
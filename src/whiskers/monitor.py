@@ -0,0 +1,196 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Detection of the steady state of a run, so that the steps spent on
+# already converged dynamics can be skipped. A run is cut into windows
+# (by default one period of the central pattern generator): the
+# prediction errors and the action are summarized by their mean and
+# standard deviation over each window, and the run has converged when
+# the means stop moving from window to window, relative to the spread
+# within a window, while a and nu stop drifting. In a steady state
+# with a still environment the last window is a cached periodic orbit,
+# from which any later step can be read given the phase of the
+# pattern generator.
+
+import numpy as np
+
+# Windowed signals compared between windows
+SIGNALS = ["PE_s_p", "PE_s_t", "da"]
+
+
+def period_steps(gp):
+    """
+    Number of steps of one period of the pattern generator of a GP
+    """
+    return int(np.ceil(2*np.pi/(np.sqrt(np.max(gp.omega2))*gp.dt)))
+
+
+def environment_changes(sim):
+    """
+    Steps at which the box of a Sim is moved
+
+    Returns:
+        int array, sorted steps t at which the box position differs
+        from that of step t - 1
+    """
+    box_pos = sim.schedule()["box_pos"]
+    return np.flatnonzero(np.any(np.diff(box_pos, axis=0) != 0,
+                                 axis=1)) + 1
+
+
+def phase(cpg, omega2):
+    """
+    Phase in [-pi, pi] of states of the pattern generator, shape
+    (n, 2), on its (nearly circular in these units) orbit
+    """
+    return np.arctan2(-cpg[..., 1]/np.sqrt(omega2), cpg[..., 0])
+
+
+def orbit_rows(orbit_cpg, cpg, omega2):
+    """
+    Rows of a cached orbit nearest in phase to states of the pattern
+    generator
+
+    Args:
+        orbit_cpg: (m, ..., 2) array, states of the cached orbit, which
+                   must cover a whole period
+        cpg: (n, ..., 2) array, states looked up, with the same batch
+             axes as orbit_cpg
+        omega2: float or array broadcasting to the batch axes, squared
+                angular frequency
+
+    Returns:
+        int array (n, ...), row of the orbit of each state
+    """
+    orbit_phase = phase(orbit_cpg, omega2)
+    target = phase(cpg, omega2)
+    rows = np.empty(target.shape, dtype=int)
+    # each agent of a batch has its own orbit
+    for index in np.ndindex(target.shape[1:]):
+        column = (slice(None),) + index
+        rows[column] = nearest_phase(orbit_phase[column], target[column])
+    return rows
+
+
+def nearest_phase(orbit_phase, target):
+    """
+    Indices of the phases of an orbit, shape (m,), nearest to target
+    phases, shape (n,)
+    """
+    order = np.argsort(orbit_phase)
+    sorted_phase = orbit_phase[order]
+    # neighbours on both sides, the first and last rows wrapping around
+    k = np.searchsorted(sorted_phase, target)
+    below = order[(k - 1) % len(order)]
+    above = order[k % len(order)]
+
+    def distance(rows):
+        d = np.abs(orbit_phase[rows] - target)
+        return np.minimum(d, 2*np.pi - d)
+
+    return np.where(distance(below) <= distance(above), below, above)
+
+
+class Monitor:
+    """
+    Windowed statistics of the prediction errors and of the action of
+    a run, and detection of their convergence
+
+    Args:
+        window: int, number of steps of a window
+        tol: float, largest change from a window to the next of the
+             mean of each signal, relative to its standard deviation
+             within the windows
+        drift: float, largest relative change of a and nu over a
+               window
+        patience: int, number of consecutive windows passing the tests
+                  after which the run is converged
+    """
+
+    def __init__(self, window, tol=0.1, drift=0.01, patience=2):
+        self.window = window
+        self.tol = tol
+        self.drift = drift
+        self.patience = patience
+        self.previous = None
+        self.passed = 0
+        self.windows = 0
+        # steps at which convergence was detected, and steps skipped
+        self.converged_at = []
+        self.skipped = 0
+
+    def reset(self):
+        """
+        Start over, e.g. after a change of the environment
+        """
+        self.previous = None
+        self.passed = 0
+
+    def window_stats(self, block):
+        stats = {}
+        for name in SIGNALS:
+            values = np.asarray(block[name])
+            stats[name] = (values.mean(axis=0), values.std(axis=0))
+        return stats
+
+    def update(self, block, step):
+        """
+        Add a window of steps
+
+        Args:
+            block: dict, (n, ...) arrays of PE_s_p, PE_s_t, da, a and nu
+            step: int, the step after the window
+
+        Returns:
+            bool, whether the run is converged
+        """
+        self.windows += 1
+        stats = self.window_stats(block)
+        passed = self.previous is not None
+        if passed:
+            for name in SIGNALS:
+                mean, std = stats[name]
+                last_mean, last_std = self.previous[name]
+                scale = 0.5*(std + last_std) + 1e-12
+                passed = passed \
+                    and np.all(np.abs(mean - last_mean) <= self.tol*scale)
+            for name in ["a", "nu"]:
+                values = np.asarray(block[name])
+                change = np.abs(values[-1] - values[0])
+                passed = passed and np.all(
+                    change <= self.drift*(np.abs(values[-1]) + 1e-12))
+        self.previous = stats
+        self.passed = self.passed + 1 if passed else 0
+        converged = self.passed >= self.patience
+        if converged:
+            self.converged_at.append(step)
+        return converged
+
+    def summary(self):
+        """
+        Returns:
+            dict, number of windows, steps at which convergence was
+            detected, and number of steps skipped
+        """
+        return {"windows": self.windows, "converged_at": self.converged_at,
+                "skipped": self.skipped}
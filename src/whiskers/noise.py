@@ -0,0 +1,194 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+
+def draw_normal(rng, shape):
+    """
+    Standard normal samples from either a RandomState or a Generator
+    """
+    if isinstance(rng, np.random.Generator):
+        return rng.standard_normal(shape)
+    return rng.randn(*shape)
+
+
+def plain(value):
+    """
+    Copy of nested dicts, lists and arrays with the arrays turned into
+    lists, so that it can be written as json
+    """
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def like(value, template):
+    """
+    Inverse of plain: turn back into arrays the lists that are arrays
+    in template
+    """
+    if isinstance(template, dict):
+        return {k: like(value[k], template[k]) for k in template}
+    if isinstance(template, np.ndarray):
+        return np.asarray(value, dtype=template.dtype)
+    return value
+
+
+def rng_state(rng):
+    """
+    State of a RandomState or a Generator, as json serializable data
+    """
+    if isinstance(rng, np.random.Generator):
+        return {"type": "Generator", "state": plain(rng.bit_generator.state)}
+    return {"type": "RandomState", "state": plain(rng.get_state())}
+
+
+def set_rng_state(rng, state):
+    """
+    Restore the state returned by rng_state
+    """
+    if state["type"] == "Generator":
+        rng.bit_generator.state = like(state["state"],
+                                       rng.bit_generator.state)
+    else:
+        name, keys, pos, has_gauss, cached = state["state"]
+        rng.set_state((name, np.asarray(keys, dtype=np.uint32), pos,
+                       has_gauss, cached))
+
+
+class NoiseStream:
+    """
+    Standard normal noise generated in blocks of many steps and served
+    one step (or a few steps) at a time
+    """
+
+    def __init__(self, shape, rng=None, block=1024, agent_ids=None):
+        """
+        Args:
+            shape: tuple, shape of the noise of one step. When agent_ids
+                   are given its first axis is the agent axis.
+            rng: RandomState or Generator, blocks are drawn from it in
+                 the same order it would give step by step. Otherwise an
+                 int or SeedSequence (or None for fresh entropy): each
+                 agent then gets its own counter-based Philox stream,
+                 spawned from the seed with the id of the agent, so the
+                 noise of an agent does not depend on how agents are
+                 batched or split across processes.
+            block: int, number of steps generated at once
+            agent_ids: sequence of int, ids of the agents of the batch,
+                       or None for a single agent (which gets the
+                       stream of agent 0)
+        """
+        self.shape = tuple(shape)
+        self.block = block
+        self.buffer = np.zeros((0,) + self.shape)
+        self.pos = 0
+
+        self.batched = agent_ids is not None
+
+        if isinstance(rng, (np.random.RandomState, np.random.Generator)):
+            self.rng = rng
+            self.generators = None
+        else:
+            self.rng = None
+            seq = rng if isinstance(rng, np.random.SeedSequence) \
+                else np.random.SeedSequence(rng)
+            if agent_ids is None:
+                agent_ids = [0]
+            self.generators = [
+                np.random.Generator(np.random.Philox(np.random.SeedSequence(
+                    seq.entropy, spawn_key=seq.spawn_key + (int(i),))))
+                for i in agent_ids]
+
+    def get_state(self):
+        """
+        State of the stream: the current block, the position in it and
+        the state of the generators
+        """
+        state = {"buffer": self.buffer.copy(), "pos": self.pos}
+        if self.generators is None:
+            state["rng"] = rng_state(self.rng)
+        else:
+            state["generators"] = [rng_state(g) for g in self.generators]
+        return state
+
+    def set_state(self, state):
+        self.buffer = np.array(state["buffer"], dtype=float)
+        self.pos = state["pos"]
+        if self.generators is None:
+            set_rng_state(self.rng, state["rng"])
+        else:
+            for generator, s in zip(self.generators, state["generators"]):
+                set_rng_state(generator, s)
+
+    def fill(self):
+        """
+        Generate the next block
+        """
+        if self.generators is None:
+            self.buffer = draw_normal(self.rng, (self.block,) + self.shape)
+        elif self.batched:
+            self.buffer = np.empty((self.block,) + self.shape)
+            for i, generator in enumerate(self.generators):
+                self.buffer[:, i] = generator.standard_normal(
+                    (self.block,) + self.shape[1:])
+        else:
+            self.buffer = self.generators[0].standard_normal(
+                (self.block,) + self.shape)
+        self.pos = 0
+
+    def draw(self, n_steps=None):
+        """
+        Noise of the next steps
+
+        Args:
+            n_steps: int, number of steps, or None for a single step
+
+        Returns:
+            array of shape (n_steps,) + shape, or shape when n_steps
+            is None
+        """
+        if n_steps is None:
+            if self.pos >= len(self.buffer):
+                self.fill()
+            self.pos += 1
+            return self.buffer[self.pos - 1]
+
+        chunks = []
+        while n_steps > 0:
+            if self.pos >= len(self.buffer):
+                self.fill()
+            n = min(n_steps, len(self.buffer) - self.pos)
+            chunks.append(self.buffer[self.pos:self.pos + n])
+            self.pos += n
+            n_steps -= n
+        if len(chunks) == 1:
+            return chunks[0]
+        return np.concatenate([np.zeros((0,) + self.shape)] + chunks)
@@ -0,0 +1,469 @@
+# Copyright (c) 2021 Francesco Mannella
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .mkvideo import vidManager
+from .profiling import NULL_TIMER
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.path as mpath
+import matplotlib.patches as mpatches
+Path = mpath.Path
+
+
+def save_or_draw(plotter):
+    # save_frame draws the figure itself, so draw only when not saving
+    if plotter.vm is not None:
+        with plotter.timer("save_frame"):
+            plotter.vm.save_frame()
+    else:
+        with plotter.timer("canvas.draw"):
+            plotter.fig.canvas.draw()
+
+
+class History:
+    """
+    Preallocated buffers of the plotted values, grown by doubling when
+    full
+    """
+
+    def __init__(self, names, capacity=256):
+        self.names = names
+        self.data = np.full((len(names), capacity), np.nan)
+        self.n = 0
+
+    def append(self, *vals):
+        if self.n == self.data.shape[1]:
+            self.data = np.hstack([self.data, np.full(self.data.shape, np.nan)])
+        # None values (e.g. no wall) are stored as nan
+        self.data[:, self.n] = np.array(vals, dtype=float)
+        self.n += 1
+
+    def get(self, name, start=0):
+        """
+        View of the values of a variable from start to the last one
+        """
+        return self.data[self.names.index(name), max(start, 0):self.n]
+
+
+class Blitter:
+    """
+    Incremental drawing of an axis. The axis is fully drawn only once
+    (or when the canvas is redrawn, e.g. on resize, pan or zoom) and
+    cached as a background. At each update the new segments of the trace
+    are drawn on the background, which is cached again, and the heads
+    are drawn on top of it.
+    """
+
+    def __init__(self, fig, ax, trace, heads, sync):
+        """
+        Args:
+            fig: matplotlib.pyplot.figure
+            ax: the axis drawn incrementally
+            trace: list of artists holding the new segments
+            heads: list of artists drawn only on the current update
+            sync: callable, brings the full-history artists up to date
+                  before a full redraw
+        """
+        self.fig = fig
+        self.ax = ax
+        self.trace = trace
+        self.heads = heads
+        self.sync = sync
+        for artist in trace + heads:
+            artist.set_animated(True)
+        self.background = None
+        # whether the full-history artists hold the segments blitted
+        # since the last full draw
+        self.synced = True
+        fig.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def on_draw(self, event):
+        # A full draw of stale history artists would be cached without
+        # the blitted segments, so they are brought up to date and the
+        # canvas is drawn again before the background is saved
+        if not self.synced:
+            self.synced = True
+            self.sync()
+            self.fig.canvas.draw()
+            return
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+
+    def update(self):
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+        self.synced = False
+        canvas.restore_region(self.background)
+        for artist in self.trace:
+            self.ax.draw_artist(artist)
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        for artist in self.heads:
+            self.ax.draw_artist(artist)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
+
+
+def polyline(vertices):
+    # The vertices of a pad of whiskers, (n_whiskers, 2, 2), as a single
+    # line broken by nan rows, so that the whole pad is one artist
+    if vertices.ndim == 2:
+        return vertices
+    gaps = np.full(vertices.shape[:-2] + (1, 2), np.nan)
+    return np.concatenate([vertices, gaps], axis=-2).reshape(-1, 2)
+
+
+class SimPlotter:
+
+    def __init__(self, sim, save=True, stream=False):
+        self.sim = sim
+        self.fig = plt.figure(figsize=(5, 5))
+        self.vm = None
+        self.timer = NULL_TIMER
+        if save:
+            self.vm = vidManager(self.fig, name=sim.name,
+                                 dirname=sim.name, duration=0.1,
+                                 stream=stream)
+        self.ax = self.fig.add_subplot(111, aspect="equal")
+
+        head_shape = mpatches.PathPatch(
+            Path(np.vstack([sim.head_points, (0, 0)]),
+                 [Path.MOVETO, Path.CURVE3, Path.CURVE3, Path.CLOSEPOLY]),
+            fc="none", transform=self.ax.transData)
+        self.head = self.ax.add_patch(head_shape)
+        self.head.set_facecolor([0.8, 0.8, 0.8])
+
+        self.whisker, = self.ax.plot(0, 0, c="k", lw=5)
+        self.set_whisker()
+        self.ax.set_xlim([-2, 2])
+        self.ax.set_ylim([-0.8, 2.5])
+
+        self.whisker_model, = self.ax.plot(0, 0, c="g", lw=5, alpha=0.5)
+        self.set_whisker_model()
+        self.ax.set_xlim([-2, 2])
+        self.ax.set_ylim([-0.8, 2.5])
+
+        self.box = None
+        self.set_box()
+
+        self.ax.set_xticks([])
+        self.ax.set_yticks([])
+        self.fig.tight_layout()
+
+    def set_box(self):
+        if self.box is not None:
+            self.box.remove()
+        box_shape = mpatches.PathPatch(
+            Path(np.vstack([self.sim.box_points, (0, 0)]),
+                 [Path.MOVETO, Path.LINETO,
+                  Path.LINETO, Path.LINETO,
+                  Path.CLOSEPOLY]),
+            fc="none", transform=self.ax.transData)
+        self.box = self.ax.add_patch(box_shape)
+        self.box.set_facecolor([0.9, 0.9, 0.9])
+
+    def set_whisker(self):
+        self.whisker.set_data(*polyline(self.sim.whisker_vertices).T)
+
+    def set_whisker_model(self):
+        self.whisker_model.set_data(
+            *polyline(self.sim.whisker_model_vertices).T)
+
+    def update(self):
+        self.set_box()
+        self.set_whisker()
+        self.set_whisker_model()
+        save_or_draw(self)
+
+    def close(self):
+        self.vm.mk_video()
+
+
+class SeriesPlotter:
+
+    def __init__(self, name, type, labels, wallcolor, color, stime, save=True,
+                 blit=False, stream=False):
+        # With blit the figure is drawn incrementally for live views and
+        # frames are not saved
+        self.fig = plt.figure(figsize=(5, 2.5))
+        self.vm = None
+        self.timer = NULL_TIMER
+        if save and not blit:
+            self.vm = vidManager(self.fig, name=name, dirname=name,
+                                 duration=1, stream=stream)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_title("Generative "+type)
+        self.wall, = self.ax.plot(-99, -99, c=wallcolor, lw=6)
+        self.x, = self.ax.plot(0, 0, c=color, lw=1.5, ls="dashed")
+        self.nu, = self.ax.plot(0, 0, c=color, lw=3)
+        self.x_head = self.ax.scatter(0, 0, s=100, c=[color])
+        self.nu_head = self.ax.scatter(0, 0, s=60, c=[color])
+        self.sigma_fill = None
+        self.ax.set_xlim([-0.1*stime, stime*1.1])
+        self.ax.set_ylim([-1.8, 3.2])
+        self.ax.set_yticks([-1, 0, 1])
+        self.ax.set_xticks([])
+        if np.sum(wallcolor) == 0:
+            plt.legend([self.x, self.nu], [labels["x"], labels["nu"]])
+        else:
+            plt.legend([self.x, self.nu, self.wall],
+                       [labels["x"], labels["nu"], "box"])
+        self.history = History(["T", "x", "nu", "wall", "sigma"])
+        self.color = color
+        self.fig.tight_layout()
+
+        self.blitter = None
+        if blit:
+            self.wall_seg, = self.ax.plot([], [], c=wallcolor, lw=6)
+            self.x_seg, = self.ax.plot([], [], c=color, lw=1.5, ls="dashed")
+            self.nu_seg, = self.ax.plot([], [], c=color, lw=3)
+            self.sigma_seg = self.ax.add_patch(mpatches.Polygon(
+                np.zeros((4, 2)), facecolor=color, edgecolor=[0, 0, 0, 0],
+                alpha=0.4))
+            self.blitter = Blitter(
+                self.fig, self.ax,
+                trace=[self.sigma_seg, self.wall_seg, self.x_seg, self.nu_seg],
+                heads=[self.x_head, self.nu_head], sync=self.sync)
+
+    def update(self, vals, t):
+        s, a, w, o = vals
+        self.history.append(t, s, a, w, o)
+        if self.blitter is not None:
+            self.set_last()
+            self.blitter.update()
+        else:
+            self.sync()
+            save_or_draw(self)
+
+    def sync(self):
+        h = self.history
+        self.set_data(h.get("T"), h.get("x"), h.get("nu"),
+                      h.get("wall"), h.get("sigma"))
+
+    def set_last(self):
+        # segments between the last two points
+        h = self.history
+        T, x, nu, wall, sigma = [h.get(name, h.n - 2) for name in h.names]
+        self.x_seg.set_data(T, x)
+        self.nu_seg.set_data(T, nu)
+        self.wall_seg.set_data(T, wall)
+        self.sigma_seg.set_xy(np.column_stack([
+            np.hstack([T, T[::-1]]),
+            np.hstack([x - sigma, (x + sigma)[::-1]])]))
+        self.x_head.set_offsets([[T[-1], x[-1]]])
+        self.nu_head.set_offsets([[T[-1], nu[-1]]])
+
+    def set_data(self, T, x_array, nu_array, wall_array, sigma_array):
+        if self.sigma_fill is not None:
+            self.sigma_fill.remove()
+        self.sigma_fill = self.ax.fill_between(
+            T,
+            np.array(x_array)-sigma_array,
+            np.array(x_array)+sigma_array,
+            facecolor=self.color,
+            edgecolor=[0, 0, 0, 0],
+            alpha=0.4,
+            zorder=-10)
+
+        self.x.set_data(T, x_array)
+        self.x_head.set_offsets([[T[-1], x_array[-1]]])
+        self.nu.set_data(T, nu_array)
+        self.nu_head.set_offsets([[T[-1], nu_array[-1]]])
+        self.wall.set_data(T, wall_array)
+
+    def plot_first(self, t):
+        self.ax.scatter(t, 2, s=300, facecolor=[0, 0, 0, 0],
+                        edgecolor=[0, 0, 0, 1])
+        self.ax.text(t, 2, "1",
+                     horizontalalignment="center",
+                     verticalalignment="center")
+
+    def plot_second(self, t):
+        self.ax.scatter(t, 2, s=300, facecolor=[0, 0, 0, 0],
+                        edgecolor=[0, 0, 0, 1])
+        self.ax.text(t, 2, "2",
+                     horizontalalignment="center",
+                     verticalalignment="center")
+
+    def close(self):
+        self.vm.mk_video()
+
+
+class PredErrPlotter:
+    def __init__(self, name, type, stime, save=True, blit=False,
+                 stream=False):
+        self.fig = plt.figure(figsize=(5, 1.5))
+        self.vm = None
+        self.timer = NULL_TIMER
+        if save and not blit:
+            self.vm = vidManager(self.fig, name=name+"_"+type,
+                                 dirname=name+"_"+type, duration=1,
+                                 stream=stream)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_title("Prediction error")
+        self.pe, = self.ax.plot(0, 0, c="k", lw=1)
+        self.pe_head = self.ax.scatter(0, 0, c="k", s=60)
+        self.ax.set_xlim([-0.1*stime, stime*1.1])
+        self.ax.set_ylim([-0.2, 0.5])
+        self.ax.set_yticks([-0.1, 0, 0.5])
+        self.ax.set_yticklabels(["-.1", "0", ".5"])
+        self.ax.set_xticks([])
+        self.history = History(["T", "pe"])
+        self.fig.tight_layout()
+
+        self.blitter = None
+        if blit:
+            self.pe_seg, = self.ax.plot([], [], c="k", lw=1)
+            self.blitter = Blitter(self.fig, self.ax, trace=[self.pe_seg],
+                                   heads=[self.pe_head], sync=self.sync)
+
+    def update(self, vals, t):
+        gs, ms = vals
+        self.history.append(t, ms-gs)
+        if self.blitter is not None:
+            self.set_last()
+            self.blitter.update()
+        else:
+            self.sync()
+            save_or_draw(self)
+
+    def sync(self):
+        self.set_data(self.history.get("T"), self.history.get("pe"))
+
+    def set_last(self):
+        # segment between the last two points
+        h = self.history
+        T, pe = h.get("T", h.n - 2), h.get("pe", h.n - 2)
+        self.pe_seg.set_data(T, pe)
+        self.pe_head.set_offsets([[T[-1], pe[-1]]])
+
+    def set_data(self, T, pe_array):
+        self.pe.set_data(T, pe_array)
+        self.pe_head.set_offsets([[T[-1], pe_array[-1]]])
+
+    def close(self):
+        self.vm.mk_video()
+
+
+class Plotter:
+
+    def __init__(self, sim, stime, type, save=True, blit=False, stream=False,
+                 timer=None):
+        # blit draws the series plots incrementally, for live views.
+        # stream appends frames to the videos instead of saving images.
+        # timer (a profiling.PhaseTimer) times the drawing of each plot.
+        self.stime = stime
+        self.type = type
+        self.stream = stream
+        self.prederr = PredErrPlotter("prederr", self.type, self.stime,
+                                      save=save, blit=blit, stream=stream)
+        self.genProcPlot = SeriesPlotter("gen_proc_" + self.type, type="process",
+                                         wallcolor=[0.2, 0.2, 0, 0.2],
+                                         labels={"x": "proprioception",
+                                                 "nu": "action (oscil. ampl.)"},
+                                         color=[.5, .2, 0], stime=self.stime,
+                                         save=save, blit=blit,
+                                         stream=stream)
+
+        self.genModPlot = SeriesPlotter("gen_mod_"+self.type, type="model",
+                                        wallcolor=[0, 0, 0, 0],
+                                        labels={"x": "proprioception prediction",
+                                                "nu": "internal cause (repr. oscill. ampl.)"},
+                                        color=[.2, .5, 0], stime=self.stime,
+                                        save=save, blit=blit,
+                                        stream=stream)
+
+        self.simPlot = SimPlotter(sim, save=save, stream=stream)
+        self.timer = NULL_TIMER if timer is None else timer
+        for p in [self.prederr, self.genProcPlot, self.genModPlot,
+                  self.simPlot]:
+            p.timer = self.timer
+        # values of the current step (the plots keep their own history
+        # and the trajectories are recorded by runner.run_simulation)
+        self.sens = 0.
+        self.sens_model = 0.
+        self.ampl = 0.
+        self.ampl_model = 0.
+        self.touch = 0.
+        self.current_touch = 0
+        self.limit = 1000
+        # predicted touch of every step, saved on close
+        self.touch_series = np.zeros(stime)
+        self.replayed = False
+
+    def update(self, t, gm, gp, limit, collision):
+
+        # get state
+        self.t = t
+        self.sens = gp.x[0]
+        self.sens_model = gm.mu[0]
+        self.ampl = gp.a[0]
+        self.ampl_model = gm.nu[0]
+        self.current_touch = gp.s_t[0]
+        self.touch = gm.touch_pred[0]
+        self.touch_series[t] = self.touch
+        self.imit = limit
+        self.collision = collision
+
+    def replay(self, t, traj):
+
+        # get state from the trajectories recorded by run_simulation, t
+        # is a row of the arrays, step traj["start"] + t of the run
+        start = int(traj.get("start", 0))
+        self.t = start + t
+        self.sens = traj["x"][t, 0]
+        self.sens_model = traj["mu"][t, 0]
+        self.ampl = traj["a"][t, 0]
+        self.ampl_model = traj["nu"][t, 0]
+        self.current_touch = traj["s_t"][t, 0]
+        self.touch = traj["touch_pred"][t, 0]
+        if not self.replayed:
+            # frames are only some of the steps, take the whole series
+            touch = traj["touch_pred"][:self.stime - start, 0]
+            self.touch_series[start:start + len(touch)] = touch
+            self.replayed = True
+        # the first whisker of a pad
+        self.imit = np.ravel(traj["angle_limit"][t])[0]
+        self.collision = bool(np.ravel(traj["collision"][t])[0])
+
+    def draw(self):
+        t = self.t
+        with self.timer("draw.prederr"):
+            self.prederr.update([self.sens, self.sens_model], t)
+        with self.timer("draw.process"):
+            self.genProcPlot.update([self.sens, self.ampl,
+                                     self.limit if self.collision
+                                     is True else None, 0], t)
+        with self.timer("draw.model"):
+            self.genModPlot.update([self.sens_model, self.ampl_model,
+                                    self.limit if self.collision
+                                    is True else None, 0], t)
+        with self.timer("draw.sim"):
+            self.simPlot.update()
+
+    def close(self):
+        # make the videos (streamed videos are complete only once closed)
+        for p in [self.simPlot, self.prederr, self.genProcPlot,
+                  self.genModPlot]:
+            if p.vm is not None:
+                p.close()
+        np.savetxt(self.type + "_touch", self.touch_series)
@@ -0,0 +1,321 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Opt-in instrumentation of the simulation loop. Code paths take a timer
+# and wrap their phases in "with timer(name):". By default they get the
+# NULL_TIMER, whose phases do nothing, so the cost of the disabled
+# instrumentation is that of an empty with statement.
+
+from time import perf_counter
+import subprocess
+import contextlib
+import argparse
+import array
+import json
+import csv
+import sys
+import os
+import numpy as np
+
+
+class NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullTimer:
+    """
+    Timer that measures nothing
+    """
+
+    enabled = False
+    phase = NullPhase()
+
+    def __call__(self, name):
+        return self.phase
+
+    def count(self, name, n=1):
+        pass
+
+    def add(self, name, duration):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Phase:
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(perf_counter() - self.start)
+        return False
+
+
+class PhaseTimer:
+    """
+    Durations of the phases of a run, and counters of events
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.samples = {}
+        self.phases = {}
+        self.counters = {}
+        self.start = perf_counter()
+
+    def __call__(self, name):
+        """
+        Context manager timing one occurrence of a phase. Phases may
+        be nested, so the time of a phase includes its subphases.
+
+        Args:
+            name: str, name of the phase
+        """
+        phase = self.phases.get(name)
+        if phase is None:
+            self.samples[name] = array.array("d")
+            phase = self.phases[name] = Phase(self.samples[name])
+        return phase
+
+    def count(self, name, n=1):
+        """
+        Increase a counter
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add(self, name, duration):
+        """
+        Record one occurrence of a phase timed elsewhere (e.g. across
+        the awaits of a coroutine)
+
+        Args:
+            name: str, name of the phase
+            duration: float, seconds
+        """
+        self(name).samples.append(duration)
+
+    def summary(self):
+        """
+        Totals and percentiles of the durations of each phase
+
+        Returns:
+            dict, maps each phase to its count, total, mean, median,
+            90th and 99th percentiles and maximum in seconds, and to
+            its share of the wall time since the timer was created.
+            Counters are under "counters".
+        """
+        wall = perf_counter() - self.start
+        phases = {}
+        for name, samples in self.samples.items():
+            s = np.frombuffer(samples, dtype=float) if len(samples) > 0 \
+                else np.zeros(1)
+            p50, p90, p99 = np.percentile(s, [50, 90, 99])
+            phases[name] = {
+                "count": len(samples),
+                "total": s.sum(),
+                "mean": s.mean(),
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+                "max": s.max(),
+                "share": s.sum()/wall,
+            }
+        return {"wall": wall, "phases": phases,
+                "counters": dict(self.counters)}
+
+    def dump(self, path):
+        """
+        Write the summary to a .json file, or to a .csv file with one
+        row per phase
+        """
+        summary = self.summary()
+        if os.path.splitext(path)[1] == ".csv":
+            fields = ["phase", "count", "total", "mean", "p50", "p90",
+                      "p99", "max", "share"]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                for name, stats in summary["phases"].items():
+                    writer.writerow(dict(stats, phase=name))
+        else:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2, default=float)
+
+    def report(self, file=sys.stdout):
+        """
+        Print the summary as a table
+        """
+        summary = self.summary()
+        print("%-20s %8s %10s %10s %10s %10s %6s" % (
+            "phase", "count", "total s", "mean us", "p50 us", "p99 us",
+            "share"), file=file)
+        for name, s in sorted(summary["phases"].items(),
+                              key=lambda item: -item[1]["total"]):
+            print("%-20s %8d %10.3f %10.1f %10.1f %10.1f %5.1f%%" % (
+                name, s["count"], s["total"], s["mean"]*1e6, s["p50"]*1e6,
+                s["p99"]*1e6, 100*s["share"]), file=file)
+        for name, n in summary["counters"].items():
+            print("%-20s %8d" % (name, n), file=file)
+        print("wall time %.3f s" % summary["wall"], file=file)
+
+
+@contextlib.contextmanager
+def profile(path=None, sampler="cprofile", top=25):
+    """
+    Profile a block of code
+
+    Args:
+        path: str, file where the profile is saved (a pstats file for
+              cprofile, an html page for pyinstrument), None to only
+              print it
+        sampler: str, "cprofile" or "pyinstrument" (which must be
+                 installed)
+        top: int, number of functions printed by cprofile
+    """
+    if sampler == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            print(profiler.output_text(unicode=True))
+            if path is not None:
+                with open(path, "w") as f:
+                    f.write(profiler.output_html())
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+
+
+def startup_times(module, top=10):
+    """
+    Measure the startup of a command in fresh interpreters, with the
+    import times reported by python -X importtime
+
+    Args:
+        module: str, the module of the command (e.g. "whiskers.demo")
+        top: int, number of the slowest imports returned
+
+    Returns:
+        dict, the wall times in seconds of an interpreter doing nothing
+        ("interpreter") and of one importing module ("startup"), and
+        the ("imports") list of the top (name, seconds) cumulative
+        import times, slowest first, leaving out the submodules of the
+        listed modules
+    """
+    # the package is importable from its parent folder even when it is
+    # not installed
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in [root, env.get("PYTHONPATH")] if path)
+
+    start = perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+    interpreter = perf_counter() - start
+    start = perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        env=env, check=True, capture_output=True, text=True)
+    startup = perf_counter() - start
+
+    # lines are "import time: self [us] | cumulative | name"
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(cumulative)*1e-6))
+    imports = []
+    for name, seconds in sorted(times, key=lambda item: -item[1]):
+        if not any(name.startswith(other + ".") for other, _ in imports):
+            imports.append((name, seconds))
+        if len(imports) == top:
+            break
+    return {"interpreter": interpreter, "startup": startup,
+            "imports": imports}
+
+
+def report_startup(module, top=10, file=sys.stdout):
+    """
+    Print the startup times of a command (see startup_times)
+    """
+    times = startup_times(module, top)
+    print("startup of %s %.3f s (interpreter alone %.3f s)" % (
+        module, times["startup"], times["interpreter"]), file=file)
+    print("%-40s %10s" % ("slowest imports", "cum. ms"), file=file)
+    for name, seconds in times["imports"]:
+        print("%-40s %10.1f" % (name, seconds*1e3), file=file)
+
+
+class StartupAction(argparse.Action):
+    """
+    The --profile-startup option of the commands, which like --version
+    acts as soon as it is parsed: it prints the startup times of the
+    command (see report_startup) and exits
+    """
+
+    def __init__(self, option_strings, module, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings, dest=dest, default=default,
+                         nargs=0, help=help)
+        self.module = module
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        report_startup(self.module)
+        parser.exit()
+
+
+def add_startup_option(parser, module):
+    """
+    Add --profile-startup to the parser of the command run by module
+    """
+    parser.add_argument("--profile-startup", action=StartupAction,
+                        module=module,
+                        help="measure the time taken to start the command "
+                        "in a fresh interpreter, print it and exit")
@@ -0,0 +1,212 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# On-disk store of the trajectories of long runs. Each variable is a
+# .npy file, preallocated for the whole run and filled chunk by chunk,
+# so a run needs memory for one chunk only, whatever its length and
+# number of agents. A meta.json file holds the number of records written
+# so far, and the files are read back as memory maps.
+
+import numpy as np
+import json
+import os
+
+META = "meta.json"
+
+
+class Recorder:
+    """
+    Writes the state variables of a run, one record every few steps,
+    into one .npy file per variable
+    """
+
+    def __init__(self, path, fields, n_steps, every=1, chunk=4096,
+                 meta=None):
+        """
+        Args:
+            path: str, folder of the store (created if needed)
+            fields: dict, maps the name of each variable to the shape
+                    of one of its values, or to a (shape, dtype) tuple
+            n_steps: int, number of steps of the run
+            every: int, decimation, only the steps that are multiples of
+                   every are recorded
+            chunk: int, number of records buffered by record before
+                   they are written
+            meta: dict, further information stored in meta.json (e.g.
+                  the configuration of the run)
+        """
+        self.path = path
+        self.n_steps = n_steps
+        self.every = every
+        self.chunk = chunk
+        self.meta = meta or {}
+        self.capacity = -(-n_steps//every)
+        os.makedirs(path, exist_ok=True)
+
+        self.fields = {}
+        self.files = {}
+        self.offsets = {}
+        for name, spec in fields.items():
+            if len(spec) == 2 and isinstance(spec[0], tuple):
+                shape, dtype = spec
+            else:
+                shape, dtype = spec, float
+            shape, dtype = tuple(shape), np.dtype(dtype)
+            self.fields[name] = (shape, dtype)
+            filename = os.path.join(path, name + ".npy")
+            # writes the header and extends the file to its final size
+            # without touching the data
+            array = np.lib.format.open_memmap(
+                filename, mode="w+", dtype=dtype,
+                shape=(self.capacity,) + shape)
+            self.offsets[name] = array.offset
+            del array
+            self.files[name] = open(filename, "r+b")
+
+        self.n_records = 0
+        self.buffers = None
+        self.n_buffered = 0
+        self.write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def append(self, records):
+        """
+        Write records after the last ones
+
+        Args:
+            records: dict, maps each variable to an array of its values
+                     of successive records
+        """
+        n = len(next(iter(records.values())))
+        if self.n_records + n > self.capacity:
+            raise ValueError("the store holds %d records" % self.capacity)
+        for name, (shape, dtype) in self.fields.items():
+            f = self.files[name]
+            row = dtype.itemsize*int(np.prod(shape))
+            f.seek(self.offsets[name] + self.n_records*row)
+            np.ascontiguousarray(records[name], dtype=dtype).tofile(f)
+        self.n_records += n
+
+    def write(self, start, block):
+        """
+        Record a block of successive steps
+
+        Args:
+            start: int, step of the first row of the block
+            block: dict, maps each variable to an (n, ...) array of
+                   its values at steps start ... start + n - 1
+        """
+        n = len(next(iter(block.values())))
+        first = -(-start//self.every)*self.every
+        if first//self.every != self.n_records + self.n_buffered:
+            raise ValueError("steps must be recorded in order")
+        self.flush()
+        rows = slice(first - start, n, self.every)
+        self.append({name: block[name][rows] for name in self.fields})
+
+    def record(self, t, values):
+        """
+        Record a single step, if it is not skipped by the decimation
+
+        Args:
+            t: int, the step
+            values: dict, the value of each variable at step t
+        """
+        if t % self.every != 0:
+            return
+        if self.buffers is None:
+            self.buffers = {name: np.zeros((self.chunk,) + shape, dtype)
+                            for name, (shape, dtype) in self.fields.items()}
+        for name, buffer in self.buffers.items():
+            buffer[self.n_buffered] = values[name]
+        self.n_buffered += 1
+        if self.n_buffered == self.chunk:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records and the metadata
+        """
+        if self.n_buffered > 0:
+            n = self.n_buffered
+            self.n_buffered = 0
+            self.append({name: buffer[:n]
+                         for name, buffer in self.buffers.items()})
+        for f in self.files.values():
+            f.flush()
+        self.write_meta()
+
+    def write_meta(self):
+        meta = {
+            "n_steps": self.n_steps,
+            "every": self.every,
+            "n_records": self.n_records,
+            "fields": {name: {"shape": list(shape), "dtype": dtype.str}
+                       for name, (shape, dtype) in self.fields.items()},
+            "meta": self.meta,
+        }
+        tmp = os.path.join(self.path, META + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2, default=float)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def close(self):
+        if self.files is None:
+            return
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files = None
+
+
+def read_meta(path):
+    with open(os.path.join(path, META)) as f:
+        return json.load(f)
+
+
+def load(path, mmap_mode="r"):
+    """
+    Open a store written by a Recorder
+
+    Args:
+        path: str, folder of the store
+        mmap_mode: str, mode of the memory maps ("r", "r+", "c"), or
+                   None to read the arrays into memory
+
+    Returns:
+        dict, the records of each variable written so far, plus the
+        "steps" they were taken at
+    """
+    meta = read_meta(path)
+    n = meta["n_records"]
+    records = {name: np.load(os.path.join(path, name + ".npy"),
+                             mmap_mode=mmap_mode)[:n]
+               for name in meta["fields"]}
+    records["steps"] = np.arange(n)*meta["every"]
+    return records
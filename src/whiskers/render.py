@@ -0,0 +1,225 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Rendering of the trajectories recorded by runner.run_simulation.
+# Every frame is drawn from the recorded arrays alone, so frames are
+# rendered independently over a pool of processes. The four panels are
+# read from the Agg buffers, composited in memory as utils/demo.sh used
+# to do with ImageMagick, and encoded by the workers too (quantized to
+# gif blocks or rgb bytes for ffmpeg), so that the parent only writes
+# the bytes of the frames in order.
+
+from concurrent.futures import ProcessPoolExecutor
+from .mkvideo import open_writer
+from .profiling import NULL_TIMER, add_startup_option
+from .sim import Sim
+import numpy as np
+import os
+
+# Width of the composited frames
+WIDTH = 400
+
+# Recorded variables needed to draw the frames
+FIELDS = ["x", "mu", "a", "nu", "collision", "frames", "start"]
+
+# The renderer of each worker process, the encoder of the writer and
+# the frame also returned as an image (-1 for none)
+renderer = None
+encode = None
+keep = -1
+
+
+class FrameRenderer:
+    """
+    Draws the frames of a recorded run
+    """
+
+    def __init__(self, traj, type):
+        """
+        Args:
+            traj: dict, trajectories recorded by run_simulation
+            type: str, type of demo ("still", "normal" or "large")
+        """
+        import matplotlib
+        matplotlib.use("Agg")
+        from .plotter import Plotter
+
+        self.traj = traj
+        # the arrays of a resumed run start at step start
+        self.start = int(traj["start"])
+        stime = self.start + len(traj["x"])
+        self.sim = Sim("demo_" + type, type, stime)
+        self.plotter = Plotter(self.sim, stime, type, save=False)
+
+    def panels(self, frame):
+        """
+        Draw the four panels of a frame
+
+        Args:
+            frame: int, index of the frame
+
+        Returns:
+            list of uint8 arrays, the rgb images of the panels
+        """
+        traj = self.traj
+        plotter = self.plotter
+        rows = traj["frames"][:frame + 1]
+        steps = self.start + rows
+        t = rows[-1]
+        sens = traj["x"][rows, 0]
+        sens_model = traj["mu"][rows, 0]
+        wall = np.where(traj["collision"][rows], plotter.limit, np.nan)
+        sigma = np.zeros(len(rows))
+
+        plotter.prederr.set_data(steps, sens_model - sens)
+        plotter.genProcPlot.set_data(steps, sens, traj["a"][rows, 0],
+                                     wall, sigma)
+        plotter.genModPlot.set_data(steps, sens_model, traj["nu"][rows, 0],
+                                    wall, sigma)
+        self.sim.move_box(self.start + t)
+        self.sim.update(traj["x"][t, 0], traj["mu"][t, 0])
+        plotter.simPlot.set_box()
+        plotter.simPlot.set_whisker()
+        plotter.simPlot.set_whisker_model()
+
+        images = []
+        for p in [plotter.simPlot, plotter.genProcPlot, plotter.genModPlot,
+                  plotter.prederr]:
+            p.fig.canvas.draw()
+            images.append(np.asarray(p.fig.canvas.buffer_rgba())[..., :3])
+        return images
+
+    def render(self, frame):
+        """
+        Composite the panels of a frame: the simulation (upside down,
+        as in the original videos) on top of the process, the model and
+        the prediction error, all scaled to the same width
+
+        Returns:
+            uint8 array, the rgb image of the frame
+        """
+        from PIL import Image
+
+        images = self.panels(frame)
+        images[0] = images[0][::-1, ::-1]
+        scaled = []
+        for image in images:
+            height = int(round(image.shape[0]*WIDTH/image.shape[1]))
+            scaled.append(np.asarray(Image.fromarray(image).resize(
+                (WIDTH, height), Image.LANCZOS)))
+        return np.vstack(scaled)
+
+
+def init_worker(traj, type, encoder, kept):
+    global renderer, encode, keep
+    renderer = FrameRenderer(traj, type)
+    encode = encoder
+    keep = kept
+
+
+def render_frame(frame):
+    image = renderer.render(frame)
+    return encode(image, frame == 0), image if frame == keep else None
+
+
+def render(traj, type, path, workers=None, duration=100, last=None,
+           timer=None):
+    """
+    Render all the frames of a run into a gif or video file
+
+    Args:
+        traj: dict, trajectories recorded by run_simulation
+        type: str, type of demo ("still", "normal" or "large")
+        path: str, output file (.gif, or any format ffmpeg knows)
+        workers: int, number of processes (default: number of cpus)
+        duration: int, display duration of each frame in milliseconds
+        last: str, if given the last frame is also saved to this image
+        timer: profiling.PhaseTimer, times the waits for the frames
+               rendered and encoded by the workers, and their writing
+    """
+    if timer is None:
+        timer = NULL_TIMER
+    traj = {name: np.asarray(traj[name]) for name in FIELDS}
+    n_frames = len(traj["frames"])
+    writer = open_writer(path, duration=duration)
+    workers = workers or os.cpu_count()
+    chunksize = max(1, n_frames // (8*workers))
+    kept = n_frames - 1 if last is not None else -1
+    image = None
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(traj, type, writer.encoder(),
+                                       kept)) as pool:
+        frames = pool.map(render_frame, range(n_frames),
+                          chunksize=chunksize)
+        for _ in range(n_frames):
+            with timer("render.wait"):
+                encoded, image = next(frames)
+            with timer("write"):
+                writer.write(encoded)
+    with timer("write"):
+        writer.close()
+
+    if image is not None:
+        from PIL import Image
+        Image.fromarray(image).save(last)
+
+
+def main(argv=None):
+    """
+    Render the frames of a run saved by the demo into a video
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trajectories",
+                        help="a .npz file saved by 'whiskers-demo -o'")
+    parser.add_argument("-t", "--type",
+                        default="still",
+                        help="type of demo. one of 'still', 'normal', ''large")
+    parser.add_argument("-o", "--output", default=None,
+                        help="output file (default: <type>.gif)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of processes")
+    parser.add_argument("--last", default=None,
+                        help="also save the last frame to this image")
+    parser.add_argument("--timings", default=None,
+                        help="save the time spent rendering and encoding "
+                        "to this .json or .csv file")
+    add_startup_option(parser, "whiskers.render")
+    args = parser.parse_args(argv)
+
+    output = args.output or args.type + ".gif"
+    with np.load(args.trajectories) as data:
+        traj = {name: data[name] for name in FIELDS}
+    timer = None
+    if args.timings is not None:
+        from .profiling import PhaseTimer
+        timer = PhaseTimer()
+    render(traj, args.type, output, workers=args.workers, last=args.last,
+           timer=timer)
+    if timer is not None:
+        timer.report()
+        timer.dump(args.timings)
+
+
+if __name__ == "__main__":
+    main()
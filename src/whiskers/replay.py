@@ -0,0 +1,205 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Open-loop evaluation of GM hyperparameters on recorded sensory data.
+# The s_t, s_p and cpg streams of a run (a record folder of demo.py
+# --record, read through memory maps, or an .npz file of demo.py -o)
+# drive a batch of GMs, one per configuration, in lockstep, so a scan
+# over many configurations reads the stream once. The actions of the
+# models are not fed back to the process: each model sees the stream
+# produced by the model of the recorded run.
+
+from .sweep import grid
+from .runner import DEFAULT_CONFIG
+from .profiling import NULL_TIMER, add_startup_option
+from .stats import ModelStats
+from .GM import GM
+import numpy as np
+import os
+
+# Parameters of GM that may differ between the models of a batch
+GM_PARAMS = ["dt", "eta", "eta_d", "eta_a", "eta_nu"]
+SIGMAS = ["Sigma_mu", "Sigma_s_p", "Sigma_s_t"]
+
+
+def load_streams(path):
+    """
+    Open the sensory streams of a recorded run
+
+    Args:
+        path: str, a record folder (see recorder.Recorder) or an .npz
+              file of run_simulation trajectories
+
+    Returns:
+        dict, "s_t", "s_p" and "cpg" arrays (memory maps for record
+        folders), and the "config" of the run when it is recorded
+    """
+    if os.path.isdir(path):
+        from .recorder import load, read_meta
+        records = load(path)
+        meta = read_meta(path)
+        if meta["every"] != 1:
+            raise ValueError("replay needs one record per step, the "
+                             "store has one every %d" % meta["every"])
+        streams = {name: records[name] for name in ["s_t", "s_p", "cpg"]}
+        streams["config"] = meta["meta"]
+        return streams
+    data = np.load(path)
+    return {name: data[name] for name in ["s_t", "s_p", "cpg"]}
+
+
+def make_batch(configs, n_whiskers, defaults=None):
+    """
+    A batched GM with one model per configuration
+
+    Args:
+        configs: list of dict, values of GM_PARAMS, SIGMAS and "nu"
+                 overriding the defaults
+        n_whiskers: int, number of whiskers of each model
+        defaults: dict, parameters shared by all models (default:
+                  runner.DEFAULT_CONFIG)
+
+    Returns:
+        GM, with parameters of shape (len(configs), 1)
+    """
+    defaults = dict(DEFAULT_CONFIG, **(defaults or {}))
+    gm = GM(dt=defaults["dt"], nu=np.ones(n_whiskers),
+            n_agents=len(configs))
+    for config in configs:
+        unknown = set(config) - set(GM_PARAMS) - set(SIGMAS) - {"nu"}
+        if unknown:
+            raise ValueError("unknown parameters %s" % sorted(unknown))
+    for name in GM_PARAMS + SIGMAS:
+        default = defaults[name] if name in defaults \
+            else np.ravel(getattr(gm, name))[0]
+        setattr(gm, name, np.array(
+            [[config.get(name, default)] for config in configs],
+            dtype=float))
+    for row, config in enumerate(configs):
+        gm.nu[row] = config.get("nu", 1.)
+    return gm
+
+
+def replay(streams, configs, whisker=0, steps=None, chunk=4096,
+           defaults=None, timer=None):
+    """
+    Drive a batch of GMs with the sensory streams of a recorded run
+
+    Args:
+        streams: dict, "s_t", "s_p" and "cpg" arrays (see load_streams)
+        configs: list of dict, one configuration per model (see
+                 make_batch)
+        whisker: int, the whisker of the run feeding the models, as the
+                 first one does in runner.run_simulation
+        steps: int, number of steps replayed (default: all)
+        chunk: int, number of steps read from the streams at once
+        defaults: dict, parameters shared by all models
+        timer: profiling.PhaseTimer, times the reads and the updates
+
+    Returns:
+        dict, one array per summary, with one value per configuration:
+        the mean free energy, the mean squared prediction errors and
+        the final and mean nu of the first whisker of each model, as
+        computed by stats.ModelStats for live runs. The configurations
+        are under "config".
+    """
+    if timer is None:
+        timer = NULL_TIMER
+    if steps is None:
+        steps = len(streams["s_t"])
+    n_whiskers = np.shape(streams["s_t"])[1]
+    gm = make_batch(configs, n_whiskers, defaults)
+
+    stats = ModelStats(gm.nu.shape)
+    sigmas = (gm.Sigma_mu, gm.Sigma_s_p, gm.Sigma_s_t)
+
+    for start in range(0, steps, chunk):
+        stop = min(start + chunk, steps)
+        with timer("read"):
+            s_t = np.array(streams["s_t"][start:stop, whisker])
+            s_p = np.array(streams["s_p"][start:stop, whisker])
+            x = np.array(streams["cpg"][start:stop, 0])
+        with timer("update"):
+            block = {name: np.empty((stop - start,) + gm.nu.shape)
+                     for name in ["PE_mu", "PE_s_p", "PE_s_t", "nu"]}
+            for t in range(stop - start):
+                gm.update(s_t[t], s_p[t], x[t])
+                for name, array in block.items():
+                    array[t] = getattr(gm, name)
+        with timer("stats"):
+            stats.update(block["PE_mu"], block["PE_s_p"], block["PE_s_t"],
+                         block["nu"], sigmas)
+
+    # the first whisker of each model
+    totals = stats.summary()
+    summary = {"free_energy": totals["mean_free_energy"][:, 0],
+               "final_nu": totals["final_nu"][:, 0],
+               "mean_nu": totals["mean_nu"][:, 0]}
+    for name in ["PE_mu", "PE_s_p", "PE_s_t"]:
+        summary["mse_" + name] = totals["mse_" + name][:, 0]
+    summary["config"] = list(configs)
+    return summary
+
+
+def main(argv=None):
+    """
+    Replay a recorded run through a grid of model configurations
+    """
+    import argparse
+    import json
+    from time import perf_counter
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log",
+                        help="record folder (whiskers-demo --record) or "
+                        ".npz file (whiskers-demo -o) of a run")
+    parser.add_argument("grid",
+                        help="json dict mapping GM parameters to lists of "
+                        "values, e.g. '{\"eta_a\": [0.01, 0.02]}'")
+    parser.add_argument("--steps", type=int, default=None,
+                        help="number of steps replayed")
+    parser.add_argument("--top", type=int, default=20,
+                        help="number of configurations printed")
+    add_startup_option(parser, "whiskers.replay")
+    args = parser.parse_args(argv)
+
+    streams = load_streams(args.log)
+    configs = grid(json.loads(args.grid))
+    start = perf_counter()
+    summary = replay(streams, configs, steps=args.steps,
+                     defaults=streams.get("config"))
+    elapsed = perf_counter() - start
+    steps = args.steps or len(streams["s_t"])
+    print("%d configurations x %d steps in %.2f s" %
+          (len(configs), steps, elapsed))
+    order = np.argsort(summary["free_energy"])
+    print("%12s %12s %12s %12s  %s" % ("free energy", "mse PE_mu",
+                                       "mse PE_s_p", "final nu", "config"))
+    for i in order[:args.top]:
+        print("%12.4g %12.4g %12.4g %12.4g  %s" % (
+            summary["free_energy"][i], summary["mse_PE_mu"][i],
+            summary["mse_PE_s_p"][i], summary["final_nu"][i],
+            json.dumps(configs[i])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .sim import Sim, WhiskerPad
+from .GP import GP
+from .GM import GM
+from .profiling import NULL_TIMER
+from .recorder import Recorder, load as recorder_load
+from .monitor import Monitor, period_steps, environment_changes, orbit_rows
+import numpy as np
+import importlib.util
+import contextlib
+from . import checkpoint
+
+
+# Parameters of the demo simulation
+DEFAULT_CONFIG = {
+    "type": "still",
+    "stime": 20000,
+    "dt": 0.01,
+    "omega2_GP": 0.5**2,
+    "alpha": [1., 1.],
+    "eta": 0.001,
+    "eta_d": 1.0,
+    "eta_a": 0.01,
+    "eta_nu": 0.002,
+    "seed": None,
+    # steps of noise generated at once from counter-based streams seeded
+    # with seed (None draws from a RandomState at each step)
+    "noise_block": None,
+    # error of the tables of the touch functions (None to evaluate them
+    # exactly, see lut.SaturatingTable). The compiled kernel reads them
+    # for speed; the python path reads them too, only to follow the
+    # same model, which is slower than evaluating np.tanh
+    "touch_tol": None,
+    # stepping of the model, "euler" or "implicit" (see GM.implicit_step,
+    # which stays stable at larger dt)
+    "integrator": "euler",
+    "frames": 200,
+    # number of whiskers of a pad (see sim.WhiskerPad), all coupled to
+    # the model; None runs the demo, where only the first whisker is
+    "whiskers": None,
+    # "box" for the contact limits of the demo, "polygon" for the first
+    # contacts with the box and the convex polygons listed in objects
+    # (see collision.Scene)
+    "contact": "box",
+    "objects": None,
+    # folder where the trajectories are written chunk by chunk instead
+    # of being kept in memory (see recorder.Recorder), one record every
+    # record_every steps
+    "record": None,
+    "record_every": 1,
+    "record_chunk": 4096,
+    # keep the trajectories (False runs in chunks of record_chunk steps
+    # and returns only the summaries)
+    "trajectory": True,
+    # streaming summaries of the model (see GM.track_stats), with the
+    # tolerance of the convergence of nu toward a
+    "stats": False,
+    "stats_tol": 0.05,
+    # fast-forward through steady states (see monitor.Monitor): "stop"
+    # ends the run once it has converged with the box still until the
+    # end, "skip" jumps instead to the next move of the box, filling
+    # the steps in between from the last window; None runs every step.
+    # Windows are converge_window steps (None for one period of the
+    # pattern generator).
+    "converge": None,
+    "converge_window": None,
+    "converge_tol": 0.1,
+    "converge_drift": 0.01,
+    # the run covers the steps from the step of the resume snapshot (0
+    # when None) to stop (stime when None), and saves its final state
+    # to the checkpoint path (see checkpoint.save)
+    "stop": None,
+    "resume": None,
+    "checkpoint": None,
+    # one of "python", "numba" or "auto" (numba when it is installed and
+    # touch_tol is set, except for pads, polygon contacts and the
+    # implicit integrator). The numba backend needs touch_tol: both
+    # backends then read the same tables and give identical
+    # trajectories, whereas the compiled tanh/cosh differ from numpy's
+    # in the last bit and the runs would separate at a contact onset.
+    "backend": "python",
+}
+
+# State variables stored at each step, with the object they are read from
+GP_FIELDS = ["cpg", "x", "a", "s_p", "s_t"]
+GM_FIELDS = ["mu", "dmu", "nu", "touch_pred", "PE_mu", "PE_s_p", "PE_s_t",
+             "da"]
+
+
+def make_config(config=None, **kwargs):
+    """
+    Fill a configuration with the default values
+
+    Args:
+        config: dict, parameters overriding DEFAULT_CONFIG
+        kwargs: further parameters overriding both
+
+    Returns:
+        dict, the complete configuration
+    """
+    full = dict(DEFAULT_CONFIG)
+    full.update(config or {})
+    full.update(kwargs)
+    return full
+
+
+def build(config):
+    """
+    Create the process, the model and the environment of a simulation
+
+    Args:
+        config: dict, a complete configuration (see make_config)
+
+    Returns:
+        (GP, GM, Sim) tuple
+    """
+    if config["noise_block"] is None:
+        rng = np.random.RandomState(config["seed"])
+    else:
+        rng = np.random.SeedSequence(config["seed"])
+    alpha = config["alpha"]
+    nu = [1., 1.]
+    n_whiskers = config["whiskers"]
+    if n_whiskers is not None:
+        # alpha holds one value per whisker or one for all of them
+        if len(alpha) != n_whiskers:
+            alpha = np.full(n_whiskers, alpha[0])
+        nu = np.ones(n_whiskers)
+    gp = GP(dt=config["dt"], omega2_GP=config["omega2_GP"],
+            alpha=alpha, rng=rng, noise_block=config["noise_block"],
+            touch_tol=config["touch_tol"],
+            tabulated=config["touch_tol"] is not None)
+    gm = GM(dt=config["dt"], eta=config["eta"], eta_d=config["eta_d"],
+            eta_a=config["eta_a"], eta_nu=config["eta_nu"], nu=nu,
+            touch_tol=config["touch_tol"],
+            tabulated=config["touch_tol"] is not None,
+            integrator=config["integrator"])
+    name = "demo_" + config["type"]
+    contact = {"contact": config["contact"], "objects": config["objects"]}
+    if n_whiskers is None:
+        sim = Sim(name, config["type"], config["stime"], **contact)
+    else:
+        sim = WhiskerPad(name, config["type"], config["stime"], n_whiskers,
+                         **contact)
+    return gp, gm, sim
+
+
+def frame_steps(config):
+    """
+    Steps at which demo.py draws a frame. The whisker geometry of Sim
+    is refreshed at these same steps, and the collision limit depends
+    on it, so headless runs refresh it too.
+    """
+    stime = config["stime"]
+    interval = max(1, int(stime / config["frames"]))
+    steps = np.arange(0, stime, interval)
+    if steps[-1] != stime - 1:
+        steps = np.append(steps, stime - 1)
+    return steps
+
+
+def allocate(gp, gm, sim, stime):
+    """
+    Preallocate the arrays holding a whole run
+
+    Returns:
+        dict, one (stime, ...) array per state variable
+    """
+    traj = {}
+    for name in GP_FIELDS:
+        traj[name] = np.zeros((stime,) + np.shape(getattr(gp, name)))
+    for name in GM_FIELDS:
+        traj[name] = np.zeros((stime,) + np.shape(gm.nu))
+    # one contact per whisker of a pad
+    shape = (stime,) + np.shape(sim.whisker_len)
+    traj["collision"] = np.zeros(shape, dtype=bool)
+    traj["angle_limit"] = np.zeros(shape)
+    return traj
+
+
+def run_steps(gp, gm, sim, start, is_frame, traj, backend, timer):
+    """
+    Run successive steps of the coupled loop, from the current state of
+    gp, gm and sim
+
+    Args:
+        start: int, first step
+        is_frame: bool array, which of the steps are frame steps
+        traj: dict, preallocated arrays receiving the steps
+        backend: str, "python" or "numba"
+        timer: profiling.PhaseTimer or NULL_TIMER
+    """
+    if backend == "numba":
+        # kernel imports numba, which takes longer than the rest of the
+        # package, so only the runs that use it import it
+        from . import kernel
+        with timer("rollout"):
+            kernel.rollout(gp, gm, sim, len(is_frame), is_frame, traj,
+                           start=start)
+        return
+
+    # the whiskers coupled to the model: all those of a pad, the first
+    # one otherwise
+    whiskers = slice(None) if isinstance(sim, WhiskerPad) else 0
+
+    delta_action = gm.da
+    for i in range(len(is_frame)):
+        t = start + i
+
+        # move box with scheduling based on type
+        # and conpute collision
+        with timer("move_box"):
+            collision, curr_angle_limit = sim.move_box(t)
+
+        # update process
+        with timer("gp.update"):
+            gp.effective_object_position[whiskers] = curr_angle_limit
+            gp.update(delta_action)
+
+        # update model
+        with timer("gm.update"):
+            delta_action = gm.update(gp.s_t[whiskers], gp.s_p[whiskers],
+                                     gp.cpg[0])
+
+        # store state
+        with timer("store"):
+            for name in GP_FIELDS:
+                traj[name][i] = getattr(gp, name)
+            for name in GM_FIELDS:
+                traj[name][i] = getattr(gm, name)
+            traj["collision"][i] = collision
+            traj["angle_limit"][i] = curr_angle_limit
+
+        if is_frame[i]:
+            with timer("sim.update"):
+                sim.update(gp.x[whiskers], gm.mu[whiskers])
+
+
+def skip(gp, gm, sim, orbit, n_steps, fill=None):
+    """
+    Fast-forward a converged run through steps where the box is still.
+    The pattern generator is advanced exactly, the other variables are
+    read from the cached orbit at the same phase, and no noise is drawn.
+    The summaries of the model, if tracked, take the skipped steps from
+    the orbit too.
+
+    Args:
+        orbit: dict, arrays of the last window run, covering a period
+        n_steps: int, number of steps skipped
+        fill: dict, (n_steps, ...) arrays receiving the skipped steps,
+              or None
+
+    Returns:
+        array, number of skipped steps in contact, per whisker
+    """
+    cpg = (gp.cpg_powers(n_steps) @ gp.cpg[..., None])[..., 0]
+    rows = orbit_rows(orbit["cpg"], cpg, gp.omega2)
+
+    # rows of the orbit, per agent when the process is batched
+    def at(name, rows):
+        array = orbit[name]
+        index = rows.reshape(rows.shape + (1,)*(array.ndim - rows.ndim))
+        return np.take_along_axis(array, index, axis=0)
+
+    if fill is not None:
+        for name, array in fill.items():
+            array[...] = at(name, rows)
+        fill["cpg"][...] = cpg
+    last = rows[-1:]
+    gp.cpg[...] = cpg[-1]
+    for name in ["x", "a", "s_p", "s_t"]:
+        getattr(gp, name)[...] = at(name, last)[0]
+    for name in ["mu", "dmu", "nu"]:
+        getattr(gm, name)[...] = at(name, last)[0]
+    for name in ["touch_pred", "PE_mu", "PE_s_p", "PE_s_t", "da"]:
+        setattr(gm, name, np.array(at(name, last)[0]))
+    gp.t += n_steps*gp.dt
+    pad = isinstance(sim, WhiskerPad)
+    if gm.stats is not None:
+        # the skipped steps count in the summaries as in collision_rate
+        coupled = slice(None) if pad else slice(1)
+        gm.stats.update(at("PE_mu", rows), at("PE_s_p", rows),
+                        at("PE_s_t", rows), at("nu", rows),
+                        (gm.Sigma_mu, gm.Sigma_s_p, gm.Sigma_s_t),
+                        target=at("a", rows)[..., coupled])
+    whiskers = slice(None) if pad else 0
+    sim.update(gp.x[whiskers], gm.mu[whiskers])
+    return at("collision", rows).sum(axis=0)
+
+
+def run_simulation(config=None, timer=None):
+    """
+    Run the coupled Sim/GP/GM loop of demo.py without any rendering
+
+    Args:
+        config: dict, parameters overriding DEFAULT_CONFIG
+        timer: profiling.PhaseTimer, times the phases of each step
+               (None for no instrumentation)
+
+    Returns:
+        dict, one (stop - start, ...) array per state variable, plus
+        the first step "start" and the "frames" at which demo.py draws,
+        as rows of the arrays (steps start + row). When config["record"] is set, the arrays are memory maps
+        of the recorded store, with one row every config["record_every"]
+        steps; when config["trajectory"] is False there are no arrays.
+        With config["stats"] the summaries of the model are under
+        "stats" (see stats.ModelStats.summary), and the fraction of
+        steps in contact under "collision_rate". With
+        config["converge"] the steps skipped are reported under
+        "converge" (see monitor.Monitor.summary), and a run stopped
+        early ends before stop. The stats and the collision_rate both
+        cover all steps up to the end of the run, skipped ones
+        included.
+    """
+    config = make_config(config)
+    stime = config["stime"]
+    if timer is None:
+        timer = NULL_TIMER
+    with timer("build"):
+        gp, gm, sim = build(config)
+        start = 0
+        if config["resume"] is not None:
+            snapshot = checkpoint.load(config["resume"])
+            checkpoint.restore(snapshot, gp, gm, sim)
+            start = snapshot["step"]
+    stop = stime if config["stop"] is None else config["stop"]
+    if not 0 <= start < stop <= stime:
+        raise ValueError("cannot run steps %d to %d of a run of %d steps"
+                         % (start, stop, stime))
+    frames = frame_steps(config)
+    is_frame = np.zeros(stime, dtype=bool)
+    is_frame[frames] = True
+
+    demo = config["whiskers"] is None and config["contact"] == "box" \
+        and config["integrator"] == "euler"
+    backend = config["backend"]
+    have_numba = importlib.util.find_spec("numba") is not None
+    tabulated = config["touch_tol"] is not None
+    if backend == "auto":
+        backend = "numba" if have_numba and demo and tabulated \
+            else "python"
+    if backend == "numba" and not have_numba:
+        raise ImportError("the numba backend requires numba")
+    if backend == "numba" and not tabulated:
+        raise ValueError("the numba backend reproduces the python one "
+                         "only with the touch tables, set touch_tol")
+    if backend == "numba" and not demo:
+        raise ValueError("the numba backend runs the single whisker demo "
+                         "with box contacts and euler steps, use the "
+                         "python backend")
+
+    if config["stats"]:
+        # nu follows the amplitude of the whiskers coupled to the model
+        coupled = slice(None) if isinstance(sim, WhiskerPad) else slice(1)
+        gm.track_stats(config["stats_tol"], target=gp.a[coupled])
+    monitor = None
+    if config["converge"] is not None:
+        if config["converge"] not in ("stop", "skip"):
+            raise ValueError("unknown converge %r" % (config["converge"],))
+        window = config["converge_window"] or period_steps(gp)
+        if config["converge"] == "skip" and (
+                config["record"] is not None or window < period_steps(gp)):
+            raise ValueError("skip needs the trajectories in memory and "
+                             "windows of at least one period")
+        monitor = Monitor(window, config["converge_tol"],
+                          config["converge_drift"])
+        changes = np.append(environment_changes(sim), stime)
+
+    if config["record"] is None and config["trajectory"]:
+        traj = allocate(gp, gm, sim, stop - start)
+        chunk = stop - start
+    else:
+        # run chunk by chunk, writing each chunk to the store if any
+        chunk = min(config["record_chunk"], stop - start)
+    if monitor is not None:
+        chunk = min(monitor.window, stop - start)
+    if config["record"] is None and config["trajectory"]:
+        block = None
+    else:
+        block = allocate(gp, gm, sim, chunk)
+    recorder = contextlib.nullcontext()
+    if config["record"] is not None:
+        fields = {name: (array.shape[1:], array.dtype)
+                  for name, array in block.items()}
+        recorder = Recorder(config["record"], fields, stop - start,
+                            every=config["record_every"], meta=config)
+    collisions = 0
+    end = first = start
+    with recorder:
+        while first < stop:
+            last = min(first + chunk, stop)
+            if block is None:
+                part = {name: array[first - start:last - start]
+                        for name, array in traj.items()}
+            else:
+                part = {name: array[:last - first]
+                        for name, array in block.items()}
+            run_steps(gp, gm, sim, first, is_frame[first:last], part,
+                      backend, timer)
+            collisions = collisions + part["collision"].sum(axis=0)
+            if config["record"] is not None:
+                with timer("record"):
+                    recorder.write(first - start, part)
+            first = end = last
+            if monitor is None or first == stop:
+                continue
+
+            # the box is still from the start of the window to next
+            next_move = changes[np.searchsorted(changes, first - chunk,
+                                                side="right")]
+            if next_move < first:
+                monitor.reset()
+            elif monitor.update(part, first):
+                next_move = min(next_move, stop)
+                if config["converge"] == "stop" and next_move == stop:
+                    monitor.skipped += stop - first
+                    break
+                if config["converge"] == "skip":
+                    with timer("skip"):
+                        fill = None
+                        if block is None:
+                            fill = {name: array[first - start:
+                                                next_move - start]
+                                    for name, array in traj.items()}
+                        collisions = collisions + skip(
+                            gp, gm, sim, part, next_move - first, fill)
+                    monitor.skipped += next_move - first
+                    monitor.reset()
+                    first = end = next_move
+    if block is None:
+        traj = {name: array[:end - start] for name, array in traj.items()}
+    elif config["record"] is not None:
+        traj = recorder_load(config["record"])
+    else:
+        traj = {}
+    stop = end
+    frames = frames[(frames >= start) & (frames < stop)] - start
+
+    if gm.stats is not None:
+        traj["stats"] = gm.stats.summary()
+        traj["collision_rate"] = collisions/(stop - start)
+    if monitor is not None:
+        traj["converge"] = monitor.summary()
+    if config["checkpoint"] is not None:
+        checkpoint.save(config["checkpoint"], gp, gm, sim, stop, config)
+    traj["start"] = start
+    traj["frames"] = frames
+    return traj
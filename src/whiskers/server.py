@@ -0,0 +1,467 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# GM as an online controller of external whiskers. Clients stream
+# sensory samples over a local socket and get back the actions of the
+# model, one GM per connection (a session). Samples of concurrent
+# sessions are gathered into micro-batches and all the models of a
+# batch are stepped by a single batched GM.update.
+#
+# The protocol is one json object per line:
+#   {"open": {"eta_a": 0.01, ...}}  optional first message, parameters
+#                                   of the session (see SessionPool)
+#                                   -> {"session": id}
+#   {"s_t": .., "s_p": .., "x": ..} a sample, s_t and s_p are numbers
+#                                   or one number per whisker, x is
+#                                   the cpg -> {"da": [..], "step": n}
+#   {"stats": true}                 -> {"stats": ..} of the session
+#   {"stats": "all"}                -> {"stats": ..} of all sessions
+#                                   and of the batches
+# Errors are answered with {"error": message}.
+
+from .runner import DEFAULT_CONFIG
+from .profiling import PhaseTimer, add_startup_option
+from time import perf_counter
+from .GM import GM
+import numpy as np
+import asyncio
+import json
+
+# Parameters that a session may set when it opens
+SESSION_PARAMS = ["dt", "eta", "eta_d", "eta_a", "eta_nu"]
+
+
+class SessionPool:
+    """
+    States and parameters of the GMs of all the sessions, one row per
+    session, stepped in batches. A batch of rows is stepped exactly as
+    each row would be by its own GM.
+
+    Args:
+        n_whiskers: int, number of whiskers of each model
+        capacity: int, initial number of rows (grown as needed)
+        defaults: dict, default parameters of the sessions
+    """
+
+    def __init__(self, n_whiskers=2, capacity=64, defaults=None):
+        self.n_whiskers = n_whiskers
+        defaults = dict(DEFAULT_CONFIG, **(defaults or {}))
+        self.defaults = {name: float(defaults[name])
+                         for name in SESSION_PARAMS}
+        # model stepping the batches, whose state and parameters are
+        # swapped in from the rows of the sessions
+        self.gm = GM(dt=1., nu=np.ones(n_whiskers))
+        self.state = {name: np.zeros((capacity, n_whiskers))
+                      for name in ["mu", "dmu", "nu", "da"]}
+        self.params = {name: np.zeros((capacity, 1))
+                       for name in SESSION_PARAMS}
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def grow(self):
+        capacity = len(self.state["mu"])
+        for table in [self.state, self.params]:
+            for name, rows in table.items():
+                table[name] = np.concatenate([rows, np.zeros_like(rows)])
+        self.free.extend(range(2*capacity - 1, capacity - 1, -1))
+
+    def open(self, params=None):
+        """
+        Add a session
+
+        Args:
+            params: dict, values of SESSION_PARAMS overriding the
+                    defaults, and "nu", the initial nu
+
+        Returns:
+            int, the row of the session
+        """
+        params = dict(params or {})
+        unknown = set(params) - set(SESSION_PARAMS) - {"nu"}
+        if unknown:
+            raise ValueError("unknown parameters %s" % sorted(unknown))
+        if not self.free:
+            self.grow()
+        row = self.free.pop()
+        for name in ["mu", "dmu", "da"]:
+            self.state[name][row] = 0.
+        self.state["nu"][row] = params.pop("nu", 1.)
+        for name, value in dict(self.defaults, **params).items():
+            self.params[name][row] = value
+        return row
+
+    def close(self, row):
+        self.free.append(row)
+
+    def step(self, rows, s_t, s_p, x):
+        """
+        Step the models of some sessions
+
+        Args:
+            rows: int array, rows of the sessions (each at most once)
+            s_t: (len(rows), n_whiskers) array, touch samples
+            s_p: (len(rows), n_whiskers) array, proprioceptive samples
+            x: (len(rows),) array, cpg samples
+
+        Returns:
+            (len(rows), n_whiskers) array, the actions
+        """
+        gm = self.gm
+        for name, rows_state in self.state.items():
+            setattr(gm, name, rows_state[rows])
+        for name, values in self.params.items():
+            setattr(gm, name, values[rows])
+        da = gm.update(s_t, s_p, x)
+        for name in ["mu", "dmu", "nu"]:
+            self.state[name][rows] = getattr(gm, name)
+        self.state["da"][rows] = da
+        return da
+
+
+class Session:
+
+    def __init__(self, id, row):
+        self.id = id
+        self.row = row
+        self.steps = 0
+        self.timer = PhaseTimer()
+
+    def stats(self):
+        summary = self.timer.summary()
+        latency = summary["phases"].get("latency", {})
+        return {"session": self.id, "steps": self.steps,
+                "throughput": self.steps/summary["wall"],
+                "latency": latency}
+
+
+class Server:
+    """
+    Micro-batching server of a SessionPool
+
+    Args:
+        pool: SessionPool, the models of the sessions
+        max_batch: int, largest number of samples stepped at once
+        max_wait: float, longest time in seconds a sample waits for a
+                  batch to fill up, which bounds the latency added by
+                  batching
+    """
+
+    def __init__(self, pool, max_batch=256, max_wait=0.001):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.sessions = {}
+        self.next_id = 0
+        self.pending = []
+        self.arrived = asyncio.Event()
+        self.full = asyncio.Event()
+        self.timer = PhaseTimer()
+
+    def open(self, params=None):
+        session = Session(self.next_id, self.pool.open(params))
+        self.sessions[session.id] = session
+        self.next_id += 1
+        return session
+
+    def close(self, session):
+        self.sessions.pop(session.id, None)
+        self.pool.close(session.row)
+
+    def sample(self, values):
+        # sensory sample of a request, as arrays of the pool shapes
+        n = self.pool.n_whiskers
+        s_t = np.broadcast_to(np.asarray(values["s_t"], dtype=float), n)
+        s_p = np.broadcast_to(np.asarray(values["s_p"], dtype=float), n)
+        return s_t, s_p, float(values["x"])
+
+    async def submit(self, session, s_t, s_p, x):
+        """
+        Queue a sample of a session and wait for its action
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((session, s_t, s_p, x, future))
+        self.arrived.set()
+        # no need to wait once every session has a sample in
+        if len(self.pending) >= min(self.max_batch, len(self.sessions)):
+            self.full.set()
+        return await future
+
+    def take_batch(self):
+        # the oldest sample of each session, up to max_batch samples
+        batch, rest, seen = [], [], set()
+        for item in self.pending:
+            if item[0].id in seen or len(batch) == self.max_batch:
+                rest.append(item)
+            else:
+                seen.add(item[0].id)
+                batch.append(item)
+        self.pending = rest
+        if not rest:
+            self.arrived.clear()
+        if len(rest) < min(self.max_batch, len(self.sessions)):
+            self.full.clear()
+        return batch
+
+    async def batcher(self):
+        """
+        Step the pending samples in batches, forever
+        """
+        while True:
+            await self.arrived.wait()
+            try:
+                await asyncio.wait_for(self.full.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+            batch = self.take_batch()
+            with self.timer("batch"):
+                rows = np.array([item[0].row for item in batch])
+                s_t = np.array([item[1] for item in batch])
+                s_p = np.array([item[2] for item in batch])
+                x = np.array([item[3] for item in batch])
+                try:
+                    da = self.pool.step(rows, s_t, s_p, x)
+                except Exception as error:
+                    for item in batch:
+                        item[4].set_exception(error)
+                    continue
+            self.timer.count("samples", len(batch))
+            for item, action in zip(batch, da):
+                item[0].steps += 1
+                item[4].set_result(action)
+
+    def stats(self, session=None):
+        if session is not None:
+            return session.stats()
+        batches = self.timer.summary()
+        return {"sessions": [s.stats() for s in self.sessions.values()],
+                "batch": batches["phases"].get("batch", {}),
+                "samples": batches["counters"].get("samples", 0)}
+
+    async def handle(self, reader, writer):
+        """
+        Serve one connection, a session
+        """
+        session = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received = perf_counter()
+                try:
+                    request = json.loads(line)
+                    if "open" in request:
+                        if session is not None:
+                            raise ValueError("the session is already open")
+                        session = self.open(request["open"])
+                        reply = {"session": session.id}
+                    elif "stats" in request:
+                        reply = {"stats": self.stats(
+                            None if request["stats"] == "all" else session)}
+                    else:
+                        if session is None:
+                            session = self.open()
+                        da = await self.submit(session,
+                                               *self.sample(request))
+                        reply = {"da": da.tolist(), "step": session.steps}
+                        session.timer.add("latency",
+                                          perf_counter() - received)
+                except (ValueError, KeyError, TypeError) as error:
+                    reply = {"error": "%s: %s" % (type(error).__name__,
+                                                  error)}
+                writer.write((json.dumps(reply, default=float) + "\n")
+                             .encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if session is not None:
+                self.close(session)
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, path=None, n_whiskers=2,
+                max_batch=256, max_wait=0.001, defaults=None):
+    """
+    Run a server until cancelled
+
+    Args:
+        host: str, address of the tcp socket
+        port: int, port of the tcp socket
+        path: str, path of a unix socket, used instead of tcp if given
+        n_whiskers: int, number of whiskers of each model
+        max_batch: int, largest batch
+        max_wait: float, longest wait of a sample for its batch
+        defaults: dict, default parameters of the sessions
+    """
+    server = Server(SessionPool(n_whiskers, defaults=defaults),
+                    max_batch=max_batch, max_wait=max_wait)
+    if path is not None:
+        listener = await asyncio.start_unix_server(server.handle, path)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    batcher = asyncio.create_task(server.batcher())
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+async def connect(host="127.0.0.1", port=8765, path=None):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def request(reader, writer, message):
+    writer.write((json.dumps(message, default=float) + "\n").encode())
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    return reply
+
+
+async def replay(traj, config=None, sessions=1, steps=None, **address):
+    """
+    Feed a recorded run to a server, as the GP fed the GM of the run,
+    from several concurrent sessions
+
+    Args:
+        traj: dict, trajectories of runner.run_simulation (or
+              recorder.load) with one record per step
+        config: dict, configuration of the run, whose GM parameters are
+                those of the sessions
+        sessions: int, number of concurrent sessions
+        steps: int, number of steps replayed (default: all)
+        address: host and port, or path, of the server
+
+    Returns:
+        dict, the largest difference between the actions served and
+        those of the run, the replay time and the stats of the server
+    """
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    params = {name: config[name] for name in SESSION_PARAMS}
+    if steps is None:
+        steps = len(traj["x"])
+    s_t = np.asarray(traj["s_t"][:steps, 0])
+    s_p = np.asarray(traj["s_p"][:steps, 0])
+    x = np.asarray(traj["cpg"][:steps, 0])
+    da = np.asarray(traj["da"][:steps])
+
+    async def run_session():
+        reader, writer = await connect(**address)
+        await request(reader, writer, {"open": params})
+        err = 0.
+        for t in range(steps):
+            reply = await request(reader, writer, {
+                "s_t": s_t[t], "s_p": s_p[t], "x": x[t]})
+            err = max(err, np.abs(np.array(reply["da"]) - da[t]).max())
+        stats = (await request(reader, writer, {"stats": True}))["stats"]
+        writer.close()
+        return err, stats
+
+    start = perf_counter()
+    results = await asyncio.gather(*[run_session() for _ in range(sessions)])
+    elapsed = perf_counter() - start
+    reader, writer = await connect(**address)
+    server_stats = (await request(reader, writer, {"stats": "all"}))["stats"]
+    writer.close()
+    return {"max_error": max(err for err, _ in results),
+            "time": elapsed,
+            "sessions": [stats for _, stats in results],
+            "server": server_stats}
+
+
+def main(argv=None):
+    """
+    Serve models to clients, or replay a recorded run against a
+    running server
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["serve", "replay"],
+                        help="run the server, or replay a recorded run "
+                        "against a running server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None,
+                        help="path of a unix socket, used instead of tcp")
+    parser.add_argument("--whiskers", type=int, default=2,
+                        help="number of whiskers of each model")
+    parser.add_argument("--max-batch", type=int, default=256,
+                        help="largest number of samples stepped at once")
+    parser.add_argument("--max-wait", type=float, default=0.001,
+                        help="longest wait in seconds of a sample for its "
+                        "batch to fill up")
+    parser.add_argument("-i", "--input", default=None,
+                        help="replay: .npz file (whiskers-demo -o) or "
+                        "record folder (whiskers-demo --record) of the "
+                        "run, simulated if not given")
+    parser.add_argument("--sessions", type=int, default=8,
+                        help="replay: number of concurrent sessions")
+    parser.add_argument("--steps", type=int, default=None,
+                        help="replay: number of steps replayed")
+    add_startup_option(parser, "whiskers.server")
+    args = parser.parse_args(argv)
+
+    if args.mode == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.unix, args.whiskers,
+                              args.max_batch, args.max_wait))
+        except KeyboardInterrupt:
+            pass
+    else:
+        import os
+        config = None
+        if args.input is None:
+            from .runner import run_simulation
+            traj = run_simulation({"seed": 0, "stime": args.steps or 2000,
+                                   "backend": "python"})
+        elif os.path.isdir(args.input):
+            from .recorder import load, read_meta
+            traj = load(args.input)
+            config = read_meta(args.input).get("meta")
+        else:
+            traj = dict(np.load(args.input))
+        result = asyncio.run(replay(
+            traj, config, args.sessions, args.steps, host=args.host,
+            port=args.port, path=args.unix))
+        n = sum(s["steps"] for s in result["sessions"])
+        latency = [s["latency"] for s in result["sessions"]]
+        print("%d sessions, %d samples in %.2f s (%.0f samples/s)" % (
+            len(latency), n, result["time"], n/result["time"]))
+        print("latency p50 %.0f us, p99 %.0f us, max %.0f us" % (
+            1e6*np.median([s["p50"] for s in latency]),
+            1e6*max(s["p99"] for s in latency),
+            1e6*max(s["max"] for s in latency)))
+        batch = result["server"]["batch"]
+        print("%d batches, %.1f samples per batch, %.0f us per batch" % (
+            batch["count"], result["server"]["samples"]/batch["count"],
+            1e6*batch["mean"]))
+        print("largest difference from the recorded actions: %g" %
+              result["max_error"])
+
+
+if __name__ == "__main__":
+    main()
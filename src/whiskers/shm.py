@@ -0,0 +1,347 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Ensembles of agents of the demo split across worker processes. The
+# state of the ensemble (cpg, x, a, mu, dmu, nu), the tables of the
+# environment and the recorded trajectories live in shared memory
+# blocks: each worker steps a contiguous slice of the agents in place,
+# and the coordinator reads the results without copies or pickling, so
+# memory grows with the size of the ensemble but not with the number of
+# workers. Each agent draws its noise from its own stream (see
+# noise.NoiseStream), so the results do not depend on the split.
+
+from multiprocessing import shared_memory
+import multiprocessing
+import threading
+import numpy as np
+from .runner import make_config, frame_steps
+from .sim import Sim
+from .GP import GP
+from .GM import GM
+
+# State variables of the agents, with the object they belong to
+GP_STATE = ["cpg", "x", "a"]
+GM_STATE = ["mu", "dmu", "nu"]
+
+# Alignment of the arrays within a block, in bytes
+ALIGN = 64
+
+
+class SharedArrays:
+    """
+    Named arrays laid out in a single shared memory block
+    """
+
+    def __init__(self, fields, name=None):
+        """
+        Args:
+            fields: dict, maps names to (shape, dtype)
+            name: str, name of an existing block to attach to, None to
+                  create a new (zeroed) block
+        """
+        self.fields = {key: (tuple(shape), np.dtype(dtype).str)
+                       for key, (shape, dtype) in fields.items()}
+        offsets = {}
+        size = 0
+        for key, (shape, dtype) in self.fields.items():
+            offsets[key] = size
+            nbytes = int(np.prod(shape))*np.dtype(dtype).itemsize
+            size += -(-nbytes//ALIGN)*ALIGN
+        self.owner = name is None
+        if self.owner:
+            self.block = shared_memory.SharedMemory(create=True,
+                                                    size=max(size, 1))
+        else:
+            # the workers share the resource tracker of the coordinator,
+            # to which attaching registers the block again, harmlessly
+            self.block = shared_memory.SharedMemory(name=name)
+        self.arrays = {key: np.ndarray(shape, dtype, buffer=self.block.buf,
+                                       offset=offsets[key])
+                       for key, (shape, dtype) in self.fields.items()}
+
+    @property
+    def spec(self):
+        """
+        Picklable description of the block, from which other processes
+        attach to it (see attach)
+        """
+        return self.block.name, self.fields
+
+    @classmethod
+    def attach(cls, spec):
+        name, fields = spec
+        return cls(fields, name=name)
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        """
+        Detach from the block, and free it when owned. Views of the
+        arrays must not be used afterwards.
+        """
+        self.arrays = {}
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+
+def split(n_agents, workers):
+    """
+    Contiguous slices of the agents, one per worker
+
+    Returns:
+        list of (start, stop) tuples
+    """
+    bounds = np.linspace(0, n_agents, workers + 1).round().astype(int)
+    return [(int(start), int(stop))
+            for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+class Ensemble:
+    """
+    Ensemble of agents of the demo, all in the same environment and
+    each with its own noise, stepped by worker processes on shared
+    memory
+    """
+
+    def __init__(self, config=None, n_agents=1, workers=None,
+                 record=("x", "nu"), record_every=1):
+        """
+        Args:
+            config: dict, parameters of the demo (see runner.make_config),
+                    the seed gives the streams of the agents
+            n_agents: int, number of agents
+            workers: int, number of processes (default: number of cpus)
+            record: sequence of str, state variables recorded at each
+                    step (see GP_STATE and GM_STATE)
+            record_every: int, decimation, only the steps that are
+                          multiples of record_every are recorded
+        """
+        self.config = make_config(config)
+        if self.config["whiskers"] is not None or \
+                self.config["contact"] != "box":
+            raise ValueError("ensembles run the single whisker demo with "
+                             "box contacts")
+        self.n_agents = n_agents
+        workers = workers or multiprocessing.cpu_count()
+        self.slices = split(n_agents, min(workers, n_agents))
+        stime = self.config["stime"]
+        n_whiskers = len(self.config["alpha"])
+
+        shapes = {name: (n_agents, n_whiskers)
+                  for name in GP_STATE + GM_STATE}
+        shapes["cpg"] = (n_agents, 2)
+        self.state = SharedArrays(
+            dict({name: (shape, float) for name, shape in shapes.items()},
+                 stop=((1,), bool), step=((1,), np.int64)))
+
+        # tables of the environment (see Sim.schedule) and the geometry
+        # of the whisker of which the contact limit depends
+        sim = Sim("ensemble", self.config["type"], stime)
+        table = sim.schedule()
+        self.env = SharedArrays({
+            "box_x": ((stime,), float),
+            "collision": ((stime,), bool),
+            "vertex_limit": ((stime,), float),
+            "height_limit": ((stime,), float),
+            "is_frame": ((stime,), bool)})
+        self.env["box_x"][:] = table["box_vertex"][:, 0]
+        for name in ["collision", "vertex_limit", "height_limit"]:
+            self.env[name][:] = table[name]
+        self.env["is_frame"][frame_steps(self.config)] = True
+        self.geometry = {
+            "base_x": float(sim.whisker_base[0]),
+            "length": float(sim.whisker_len),
+            "scale": float(sim.whisker_angle_ampl_scale),
+            "base_angle": float(sim.whisker_base_angle),
+            "tip_x": float(sim.whisker_vertices[1][0])}
+
+        self.record_every = record_every
+        n_records = -(-stime//record_every)
+        self.traj = SharedArrays({name: ((n_records,) + shapes[name], float)
+                                  for name in record})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        for block in [self.state, self.env, self.traj]:
+            block.close()
+
+    def run(self, chunk=None, callback=None):
+        """
+        Run the whole ensemble. Results are read from the state and
+        traj blocks (e.g. ensemble.traj["nu"]), valid until close.
+
+        Args:
+            chunk: int, with None each worker runs all the steps on its
+                   own. Otherwise workers stop at a barrier every chunk
+                   steps, where callback is called.
+            callback: function (step, ensemble) called at each barrier,
+                      with the steps up to step done by all the workers.
+                      It can read the shared arrays while the workers
+                      wait, and stops the run by returning True.
+
+        Returns:
+            int, the number of steps run
+        """
+        stime = self.config["stime"]
+        ctx = multiprocessing.get_context()
+        barrier = None
+        if chunk is not None:
+            barrier = ctx.Barrier(len(self.slices) + 1)
+        specs = (self.state.spec, self.env.spec, self.traj.spec)
+        processes = [ctx.Process(
+            target=_work, args=(specs, self.config, self.geometry, start,
+                                stop, self.record_every, chunk, barrier))
+            for start, stop in self.slices]
+        for p in processes:
+            p.start()
+        try:
+            if barrier is not None:
+                for stop in range(chunk, stime + chunk, chunk):
+                    stop = min(stop, stime)
+                    # the workers have run up to stop
+                    barrier.wait()
+                    if callback is not None and callback(stop, self):
+                        self.state["stop"][0] = True
+                    # let them go on, or quit
+                    barrier.wait()
+                    if self.state["stop"][0]:
+                        break
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            for p in processes:
+                p.join()
+        failed = [p.exitcode for p in processes if p.exitcode != 0]
+        if failed:
+            raise RuntimeError("%d ensemble workers failed" % len(failed))
+        return int(self.state["step"][0])
+
+
+def _work(specs, config, geometry, start, stop, record_every, chunk,
+          barrier):
+    # Worker process: steps the agents start ... stop - 1
+    state, env, traj = [SharedArrays.attach(spec) for spec in specs]
+    try:
+        _run_agents(state, env, traj, config, geometry, start, stop,
+                    record_every, chunk, barrier)
+    except BaseException:
+        if barrier is not None:
+            barrier.abort()
+        raise
+    finally:
+        for block in [state, env, traj]:
+            block.close()
+
+
+def _run_agents(state, env, traj, config, geometry, start, stop,
+                record_every, chunk, barrier):
+    n = stop - start
+    agents = slice(start, stop)
+    gp = GP(dt=config["dt"], omega2_GP=config["omega2_GP"],
+            alpha=config["alpha"], rng=np.random.SeedSequence(config["seed"]),
+            n_agents=n, noise_block=config["noise_block"] or 1024,
+            agent_ids=np.arange(start, stop), touch_tol=config["touch_tol"],
+            tabulated=config["touch_tol"] is not None)
+    gm = GM(dt=config["dt"], eta=config["eta"], eta_d=config["eta_d"],
+            eta_a=config["eta_a"], eta_nu=config["eta_nu"],
+            nu=np.ones(len(config["alpha"])), n_agents=n,
+            touch_tol=config["touch_tol"],
+            tabulated=config["touch_tol"] is not None,
+            integrator=config["integrator"])
+    # the models update their state in place, so rebinding it to the
+    # shared arrays makes every step visible to the coordinator
+    for model, names in [(gp, GP_STATE), (gm, GM_STATE)]:
+        for name in names:
+            state[name][agents] = getattr(model, name)
+            setattr(model, name, state[name][agents])
+    records = {name: traj[name][:, agents] for name in traj.fields}
+
+    stime = config["stime"]
+    chunk = chunk or stime
+    tip_x = np.full(n, geometry["tip_x"])
+    delta_action = gm.da
+    for first in range(0, stime, chunk):
+        for t in range(first, min(first + chunk, stime)):
+            # contact limit of the first whisker, as Sim.move_box
+            limit = np.pi
+            if env["collision"][t]:
+                limit = np.where(env["box_x"][t] - 0.1 > tip_x,
+                                 env["vertex_limit"][t],
+                                 env["height_limit"][t])
+            gp.effective_object_position[:, 0] = limit
+            gp.update(delta_action)
+            # the model of each agent is coupled to its first whisker
+            delta_action = gm.update(gp.s_t[:, :1], gp.s_p[:, :1],
+                                     gp.cpg[:, 0])
+
+            if t % record_every == 0:
+                for name, record in records.items():
+                    record[t//record_every] = state[name][agents]
+            if env["is_frame"][t]:
+                # whisker tip, as Sim.update and Sim.set_whisker
+                angle = geometry["scale"]*gp.x[:, 0]*np.pi \
+                    + geometry["base_angle"]
+                tip_x = geometry["base_x"] \
+                    + np.cos(np.pi - angle)*geometry["length"]
+        if start == 0:
+            state["step"][0] = t + 1
+        if barrier is not None:
+            barrier.wait()
+            barrier.wait()
+            if state["stop"][0]:
+                break
+
+
+if __name__ == "__main__":
+
+    import argparse
+    from time import perf_counter
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--agents", type=int, default=256,
+                        help="number of agents")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of processes")
+    parser.add_argument("--stime", type=int, default=2000,
+                        help="number of steps")
+    parser.add_argument("--chunk", type=int, default=None,
+                        help="synchronize the workers every chunk steps")
+    args = parser.parse_args()
+
+    config = {"seed": 0, "stime": args.stime}
+    with Ensemble(config, args.agents, args.workers) as ensemble:
+        start = perf_counter()
+        steps = ensemble.run(args.chunk)
+        elapsed = perf_counter() - start
+        nu = ensemble.traj["nu"][:, :, 0]
+        print("%d agents x %d steps on %d workers in %.2f s" % (
+            args.agents, steps, len(ensemble.slices), elapsed))
+        print("final nu: mean %.4f, std %.4f" % (nu[-1].mean(),
+                                                 nu[-1].std()))
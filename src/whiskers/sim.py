@@ -0,0 +1,480 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from .collision import Scene
+import numpy as np
+
+# %%
+
+
+def a2xy(angle, radius=1):
+    return np.cos(angle)*radius, np.sin(angle)*radius
+
+
+def ik_angle(origin, point):
+    angle = 0
+    dx = (point[0] - origin[0])
+    dy = (point[1] - origin[1])
+    if np.abs(dx) > 1e-30:
+        aa = dy/dx
+        angle = np.arctan(aa)
+    return angle
+
+
+class Sim:
+
+    def __init__(self, name, type, stime, objects=None, contact="box",
+                 cell=None):
+        # contact is "box", for the limits of the demo, computed from
+        # the first vertex of the box, or "polygon", for the first
+        # contacts of the whiskers, while moving up from their base
+        # angle, with the box and the further convex polygons in objects
+        # (see collision.Scene, cell is the size of its grid)
+
+        self.name = name
+        self.type = type
+        self.stime = stime
+
+        sidewidth = 0.8
+        sideheight = 1.5
+        center = [0, 1]
+        still_box = np.array([
+            (-sidewidth, -sideheight),
+            (sidewidth, -sideheight),
+            (sidewidth, sideheight),
+            (-sidewidth, sideheight)]) + center
+
+        sidewidth = 1.2
+        sideheight = 1.5
+        center = [0, 1]
+        normal_box = np.array([
+            (-sidewidth, -sideheight),
+            (sidewidth, -sideheight),
+            (sidewidth, sideheight),
+            (-sidewidth, sideheight)]) + center
+
+        sidewidth = 5
+        sideheight = 1.5
+        center = [0, 1]
+        large_box = np.array([
+            (-sidewidth, -sideheight),
+            (sidewidth, -sideheight),
+            (sidewidth, sideheight),
+            (-sidewidth, sideheight)]) + center
+
+        if type == "still":
+            self.points = still_box
+        elif type == "normal":
+            self.points = normal_box
+        elif type == "large":
+            self.points = large_box
+
+        self.head_points = np.array([(-1, -0.75), (0, 1.5), (1, -0.75)])
+
+        self.whisker_base = np.array([-0.25, 0])
+        self.whisker_angle_ampl_scale = 0.35
+        self.whisker_base_angle = np.pi*0.05
+        self.whisker_len = 1.3
+        self.whisker_init_angle = np.pi/4
+        self.set_whisker(self.whisker_init_angle)
+
+        self.whisker_model_base = np.array([-0.25, 0])
+        self.whisker_model_len = 1.3
+        self.whisker_model_init_angle = np.pi/4
+        self.set_whisker_model(self.whisker_model_init_angle)
+
+        self.angle = None
+        self.box_points_init = np.array(self.points, dtype=float)
+        self.box_points = self.box_points_init.copy()
+        # table step at which the box was placed last (see place_box)
+        self.box_step = None
+        self.box_pos = 3
+
+        self.contact = contact
+        self.scene = None
+        if contact == "polygon":
+            self.scene = Scene([self.box_points_init] + list(objects or []),
+                               cell=cell, moving=[0])
+        elif contact != "box":
+            raise ValueError("unknown contact %r" % contact)
+
+        # Whole-run tables of box position and collision limits,
+        # filled chunk by chunk when first needed (see schedule)
+        self.table_chunk = 4096
+        self.table = None
+        self.move_box(0)
+
+    def box_position(self, t):
+
+        t_ratio = t/self.stime
+        # compute box position
+        if self.type == "still":
+            bottom = 1.2
+            rng = 1.6
+        elif self.type == "normal":
+            bottom = 1.2
+            rng = 1.6
+        elif self.type == "large":
+            bottom = 1.2
+            rng = 1.6
+
+        top = bottom + rng
+
+        if t_ratio < 0.15:
+            box_pos = np.array([0, top])
+        elif 0.15 <= t_ratio < 0.25:
+            e = 1 - (t_ratio - 0.15)/0.1
+            box_pos = np.array([0, bottom + rng * e])
+        elif 0.25 <= t_ratio < 0.5:
+            box_pos = np.array([0, bottom])
+        elif 0.5 <= t_ratio < 0.6:
+            e = (t_ratio - 0.5)/0.1
+            box_pos = np.array([0, bottom + rng * e])
+        else:
+            box_pos = np.array([0, top])
+
+        return box_pos
+
+    def box_positions(self, t):
+        # Vectorized box_position, for an array of steps
+
+        t_ratio = np.asarray(t)/self.stime
+        bottom = 1.2
+        rng = 1.6
+        top = bottom + rng
+
+        box_y = np.select(
+            [t_ratio < 0.15,
+             t_ratio < 0.25,
+             t_ratio < 0.5,
+             t_ratio < 0.6],
+            [top,
+             bottom + rng * (1 - (t_ratio - 0.15)/0.1),
+             bottom,
+             bottom + rng * ((t_ratio - 0.5)/0.1)],
+            top)
+        return np.column_stack([np.zeros(len(box_y)), box_y])
+
+    def collision_limits(self, box_vertex):
+        # Vectorized detect_collision for an array of positions of the
+        # first box vertex. Both possible limits are returned, since
+        # which one applies depends on the whisker angle at that time:
+        # the vertex limit when box_vertex[:, 0] - 0.1 is beyond the
+        # whisker tip, the height limit otherwise. With arrays of
+        # whisker geometries (see WhiskerPad) the limits have one
+        # column per whisker.
+
+        box_vertex = np.reshape(
+            box_vertex, (-1, 2) + (1,)*np.ndim(self.whisker_len))
+        box_height = box_vertex[:, 1]
+        whisker_head = self.whisker_base[..., 1] + self.whisker_len
+        collision = box_height < whisker_head
+
+        dx = box_vertex[:, 0] - self.whisker_base[..., 0]
+        dy = box_vertex[:, 1] - self.whisker_base[..., 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            angle_to_box_vertex = np.where(
+                np.abs(dx) > 1e-30, np.arctan(dy/dx), 0)
+            box_height_whisk_angle = -np.arcsin(
+                (box_height - 0.1 - self.whisker_base[..., 1])
+                / self.whisker_len)
+        vertex_limit = np.abs(angle_to_box_vertex + self.whisker_base_angle)
+        height_limit = np.abs(box_height_whisk_angle + self.whisker_base_angle)
+
+        return collision, vertex_limit, height_limit
+
+    def schedule(self, start=0, stop=None):
+        """
+        Tables of the environment for the steps start ... stop - 1
+
+        Returns:
+            dict, with "box_pos" (positions of the box), "box_vertex"
+            (positions of its first vertex), "collision", "vertex_limit"
+            and "height_limit" arrays (see collision_limits)
+        """
+        if stop is None:
+            stop = self.stime
+        if self.table is None:
+            n_chunks = -(-self.stime // self.table_chunk)
+            shape = (self.stime,) + np.shape(self.whisker_len)
+            self.table = {
+                "box_pos": np.zeros((self.stime, 2)),
+                "collision": np.zeros(shape, dtype=bool),
+                "vertex_limit": np.zeros(shape),
+                "height_limit": np.zeros(shape),
+                "filled": np.zeros(n_chunks, dtype=bool)}
+        table = self.table
+        for chunk in range(start // self.table_chunk,
+                           -(-stop // self.table_chunk)):
+            if table["filled"][chunk]:
+                continue
+            steps = np.arange(chunk*self.table_chunk,
+                              min((chunk + 1)*self.table_chunk, self.stime))
+            table["box_pos"][steps] = self.box_positions(steps)
+            box_vertex = self.box_points_init[0] + table["box_pos"][steps]
+            (table["collision"][steps],
+             table["vertex_limit"][steps],
+             table["height_limit"][steps]) = self.collision_limits(box_vertex)
+            table["filled"][chunk] = True
+
+        tables = {name: table[name][start:stop]
+                  for name in ["box_pos", "collision",
+                               "vertex_limit", "height_limit"]}
+        tables["box_vertex"] = self.box_points_init[0] + tables["box_pos"]
+        return tables
+
+    def move_box(self, t):
+
+        if self.scene is not None:
+            self.box_points = self.box_points_init + self.box_position(t)
+            self.box_step = None
+            return self.polygon_contacts()
+
+        if not (isinstance(t, (int, np.integer)) and 0 <= t < self.stime):
+            self.box_points = self.box_points_init + self.box_position(t)
+            self.box_step = None
+            collision, curr_angle_limit = self.detect_collision()
+            return collision, curr_angle_limit
+
+        # look the step up in the tables
+        if self.table is None or \
+                not self.table["filled"][t // self.table_chunk]:
+            self.schedule(t, t + 1)
+        self.place_box(t)
+        box_vertex = self.box_points[0]
+        collision = bool(self.table["collision"][t])
+        curr_angle_limit = np.pi
+        if collision:
+            if box_vertex[0] - 0.1 > self.whisker_vertices[1][0]:
+                curr_angle_limit = self.table["vertex_limit"][t]
+            else:
+                curr_angle_limit = self.table["height_limit"][t]
+        return collision, curr_angle_limit
+
+    def place_box(self, t):
+        # move the box to the tabulated step t, writing the points in
+        # place and only if the box moved since the step placed last
+        pos = self.table["box_pos"]
+        last = self.box_step
+        if last is None or pos[t, 0] != pos[last, 0] or \
+                pos[t, 1] != pos[last, 1]:
+            np.add(self.box_points_init, pos[t], out=self.box_points)
+        self.box_step = t
+
+    def set_whisker(self, angle):
+        self.angle = angle
+        self.whisker_vertices = self.whisker_base + \
+            np.vstack([(0, 0), a2xy(np.pi - self.angle, self.whisker_len)])
+
+    def set_whisker_model(self, angle):
+        self.whisker_model_vertices = self.whisker_model_base + \
+            np.vstack([(0, 0), a2xy(np.pi - angle, self.whisker_model_len)])
+
+    def update(self, angle, angle_model):
+        angle = self.whisker_angle_ampl_scale*angle * np.pi + \
+            self.whisker_base_angle
+        angle_model = self.whisker_angle_ampl_scale * angle_model*np.pi + \
+            self.whisker_base_angle
+        self.set_whisker(angle)
+        self.set_whisker_model(angle_model)
+
+    def detect_collision(self):
+
+        box_height = self.box_points[0][1]
+        whisker_head = self.whisker_base + self.whisker_len
+
+        in_collision_with_vertex = box_height < whisker_head[1]
+
+        collision = False
+        curr_angle_limit = np.pi
+        if in_collision_with_vertex:
+
+            if self.box_points[0][0] - 0.1 > self.whisker_vertices[1][0]:
+                angle_to_box_vertex = ik_angle(self.whisker_base,
+                                               self.box_points[0])
+                angle_to_box_vertex = np.abs(angle_to_box_vertex +
+                                             self.whisker_base_angle)
+                curr_angle_limit = angle_to_box_vertex
+            else:
+                box_height_whisk_angle = -np.arcsin(
+                    (box_height - 0.1 - self.whisker_base[1]) / self.whisker_len)
+                box_height_whisk_angle = np.abs(
+                    box_height_whisk_angle + self.whisker_base_angle)
+                curr_angle_limit = box_height_whisk_angle
+
+            collision = True
+
+        return (collision, curr_angle_limit)
+
+    def polygon_contacts(self):
+        # First contacts with the objects of the scene. The limits are
+        # those of detect_collision: the angle swept from the base angle
+        # to the contact, in radians, and pi without contact
+        self.scene.move(0, self.box_points[0] - self.box_points_init[0])
+        collision, angle, _ = self.scene.contacts(
+            self.whisker_base, self.whisker_len, self.whisker_base_angle)
+        limit = np.where(collision, np.abs(angle - self.whisker_base_angle),
+                         np.pi)
+        if np.ndim(limit) == 0:
+            limit = float(limit)
+        return collision, limit
+
+    def get_state(self):
+        # The box is placed by move_box at each step, the whisker
+        # geometry is that of the last update (it affects the limits)
+        return {"box_points": self.box_points.copy(),
+                "whisker_vertices": self.whisker_vertices.copy(),
+                "whisker_model_vertices": self.whisker_model_vertices.copy(),
+                "angle": self.angle}
+
+    def set_state(self, state):
+        self.box_points = np.array(state["box_points"], dtype=float)
+        self.box_step = None
+        self.whisker_vertices = np.array(state["whisker_vertices"],
+                                         dtype=float)
+        self.whisker_model_vertices = np.array(
+            state["whisker_model_vertices"], dtype=float)
+        self.angle = state["angle"]
+
+    def close(self):
+        self.vm.mk_video()
+
+
+def pad_geometry(n_whiskers):
+    """
+    Default geometry of a pad of whiskers: a fan of whiskers that get
+    shorter and more tilted going down the snout. The first whisker is
+    the one of Sim.
+
+    Returns:
+        (whisker_base, whisker_len, whisker_base_angle) tuple of arrays
+        of shapes (n_whiskers, 2), (n_whiskers,) and (n_whiskers,)
+    """
+    row = np.linspace(0, 1, n_whiskers)
+    whisker_base = np.column_stack([-0.25 + 0.15*row, -0.3*row])
+    whisker_len = 1.3 - 0.5*row
+    whisker_base_angle = np.pi*(0.05 + 0.1*row)
+    return whisker_base, whisker_len, whisker_base_angle
+
+
+class WhiskerPad(Sim):
+    """
+    Sim with a pad of whiskers, all moving against the same box. Each
+    whisker has its own base, length and base angle, and the angles,
+    vertices and collision limits of all the whiskers are arrays with
+    one row per whisker, updated in single array operations.
+
+    Args:
+        name: str, name of the simulation
+        type: str, type of box, "still", "normal" or "large"
+        stime: int, number of steps
+        n_whiskers: int, number of whiskers of the pad
+        geometry: (whisker_base, whisker_len, whisker_base_angle) tuple
+                  of arrays (default: pad_geometry(n_whiskers))
+        kwargs: objects, contact and cell, as for Sim
+    """
+
+    def __init__(self, name, type, stime, n_whiskers, geometry=None,
+                 **kwargs):
+
+        super().__init__(name, type, stime, **kwargs)
+        if geometry is None:
+            geometry = pad_geometry(n_whiskers)
+        whisker_base, whisker_len, whisker_base_angle = geometry
+        self.n_whiskers = n_whiskers
+        self.whisker_base = np.broadcast_to(
+            whisker_base, (n_whiskers, 2)).astype(float)
+        self.whisker_len = np.broadcast_to(
+            whisker_len, (n_whiskers,)).astype(float)
+        self.whisker_base_angle = np.broadcast_to(
+            whisker_base_angle, (n_whiskers,)).astype(float)
+        self.whisker_model_base = self.whisker_base
+        self.whisker_model_len = self.whisker_len
+        self.set_whisker(np.full(n_whiskers, self.whisker_init_angle))
+        self.set_whisker_model(
+            np.full(n_whiskers, self.whisker_model_init_angle))
+
+        # the tables of Sim hold a single whisker
+        self.table = None
+        self.move_box(0)
+
+    def select_limits(self, collision, vertex_limit, height_limit):
+        # limits of the whiskers in contact, the vertex limit for those
+        # whose tip is short of the box vertex (see detect_collision)
+        vertex = self.box_points[0][0] - 0.1 > self.whisker_vertices[..., 1, 0]
+        return np.where(collision,
+                        np.where(vertex, vertex_limit, height_limit), np.pi)
+
+    def move_box(self, t):
+
+        if self.scene is not None:
+            return super().move_box(t)
+
+        if not (isinstance(t, (int, np.integer)) and 0 <= t < self.stime):
+            self.box_points = self.box_points_init + self.box_position(t)
+            self.box_step = None
+            return self.detect_collision()
+
+        if self.table is None or \
+                not self.table["filled"][t // self.table_chunk]:
+            self.schedule(t, t + 1)
+        self.place_box(t)
+        collision = self.table["collision"][t]
+        return collision, self.select_limits(
+            collision, self.table["vertex_limit"][t],
+            self.table["height_limit"][t])
+
+    def detect_collision(self):
+        collision, vertex_limit, height_limit = [
+            limits[0] for limits in self.collision_limits(self.box_points[0])]
+        return collision, self.select_limits(
+            collision, vertex_limit, height_limit)
+
+    def whiskers(self, base, length, angle):
+        # (n_whiskers, 2, 2) array of base and tip of each whisker
+        tip = base + np.stack(a2xy(np.pi - angle, length), axis=-1)
+        return np.stack([base, tip], axis=-2)
+
+    def set_whisker(self, angle):
+        self.angle = angle
+        self.whisker_vertices = self.whiskers(
+            self.whisker_base, self.whisker_len, angle)
+
+    def set_whisker_model(self, angle):
+        self.whisker_model_vertices = self.whiskers(
+            self.whisker_model_base, self.whisker_model_len, angle)
+
+    def update(self, angle, angle_model):
+        angle = self.whisker_angle_ampl_scale*np.asarray(angle)*np.pi + \
+            self.whisker_base_angle
+        angle_model = self.whisker_angle_ampl_scale * \
+            np.asarray(angle_model)*np.pi + self.whisker_base_angle
+        self.set_whisker(angle)
+        self.set_whisker_model(angle_model)
+
+
+if __name__ == "__main__":
+    sim = Sim("demo", "still", 1000)
+    sim.move_box(0)
+    for a in np.linspace(0, 50*np.pi, 1000):
+        sim.update(np.sin(a), np.sin(a))
@@ -0,0 +1,178 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Streaming reductions of the variables of a run, updated step by step
+# (or block by block) in constant memory, so that a run can be
+# summarized without keeping its trajectories.
+
+import numpy as np
+
+
+class Welford:
+    """
+    Running mean and variance of an array quantity, elementwise
+
+    Args:
+        shape: tuple, shape of the quantity
+    """
+
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.last = np.zeros(shape)
+
+    def update(self, block):
+        """
+        Add a block of values, of shape (n, ...), merging its mean and
+        variance with those so far (Welford's update when n is 1)
+        """
+        n = len(block)
+        if n == 0:
+            return
+        total = self.count + n
+        mean = block.mean(axis=0)
+        delta = mean - self.mean
+        self.mean = self.mean + delta*(n/total)
+        self.m2 = self.m2 + ((block - mean)**2).sum(axis=0) \
+            + delta**2*(self.count*n/total)
+        self.count = total
+        self.last = np.array(block[-1])
+
+    @property
+    def var(self):
+        return self.m2/max(self.count, 1)
+
+    def summary(self):
+        return {"mean": self.mean, "var": self.var, "last": self.last}
+
+
+def free_energy(PE_mu, PE_s_p, PE_s_t, Sigma_mu, Sigma_s_p, Sigma_s_t):
+    """
+    Variational free energy of the GM under the Laplace approximation,
+    per whisker (up to a constant)
+    """
+    return 0.5*(PE_mu**2/Sigma_mu + PE_s_p**2/Sigma_s_p
+                + PE_s_t**2/Sigma_s_t
+                + np.log(Sigma_mu) + np.log(Sigma_s_p) + np.log(Sigma_s_t))
+
+
+class Convergence:
+    """
+    Time at which a quantity settles within tol of a target
+
+    Args:
+        shape: tuple, shape of the quantity
+        tol: float, tolerance
+    """
+
+    def __init__(self, shape, tol):
+        self.tol = tol
+        self.steps = 0
+        # step since which the quantity is within tol, -1 when it is
+        # currently out
+        self.since = -np.ones(shape, dtype=int)
+
+    def update(self, values, targets):
+        """
+        Add a block of values and of their targets, of shape (n, ...)
+        """
+        n = len(values)
+        out = np.abs(values - targets) > self.tol
+        # last step of the block out of tol
+        last_out = n - 1 - np.argmax(out[::-1], axis=0)
+        since = np.where(self.since >= 0, self.since, self.steps)
+        since = np.where(out.any(axis=0), self.steps + last_out + 1, since)
+        self.since = np.where(since >= self.steps + n, -1, since)
+        self.steps += n
+
+
+class ModelStats:
+    """
+    Streaming summaries of a GM: running mean and variance of its
+    prediction errors, of nu and of the target of nu, cumulative free
+    energy and time to convergence of nu toward its target (the a of
+    the GP). All have the shape of nu, (n_whiskers,) or (n_agents,
+    n_whiskers).
+
+    Args:
+        shape: tuple, shape of nu
+        tol: float, tolerance of the convergence of nu
+        target: array, the target of nu, read at each update (e.g. a
+                view of gp.a, which GP.update changes in place)
+    """
+
+    def __init__(self, shape, tol=0.05, target=None):
+        self.target = target
+        self.errors = {name: Welford(shape)
+                       for name in ["PE_mu", "PE_s_p", "PE_s_t"]}
+        self.nu = Welford(shape)
+        self.a = Welford(shape)
+        self.free_energy = np.zeros(shape)
+        self.convergence = Convergence(shape, tol)
+
+    def update(self, PE_mu, PE_s_p, PE_s_t, nu, sigmas, target=None):
+        """
+        Add a block of steps
+
+        Args:
+            PE_mu, PE_s_p, PE_s_t: (n, ...) arrays, prediction errors
+            nu: (n, ...) array, nu after each step
+            sigmas: (Sigma_mu, Sigma_s_p, Sigma_s_t) of the model
+            target: (n, ...) array, target of nu at each step (default:
+                    the current value of the target array)
+        """
+        for name, block in zip(["PE_mu", "PE_s_p", "PE_s_t"],
+                               [PE_mu, PE_s_p, PE_s_t]):
+            self.errors[name].update(block)
+        self.free_energy += free_energy(PE_mu, PE_s_p, PE_s_t,
+                                        *sigmas).sum(axis=0)
+        self.nu.update(nu)
+        if target is None and self.target is not None:
+            target = np.broadcast_to(self.target, nu.shape)
+        if target is not None:
+            target = np.broadcast_to(target, nu.shape)
+            self.a.update(target)
+            self.convergence.update(nu, target)
+
+    def summary(self):
+        """
+        Returns:
+            dict of arrays: mean, variance and mean square of each
+            prediction error, mean and last nu and a, total and mean
+            free energy, and "converged_at", the step since which nu is
+            within tol of a (-1 if it is not at the end)
+        """
+        steps = max(self.nu.count, 1)
+        summary = {"steps": self.nu.count,
+                   "free_energy": self.free_energy,
+                   "mean_free_energy": self.free_energy/steps,
+                   "converged_at": self.convergence.since}
+        for name, welford in self.errors.items():
+            summary["mean_" + name] = welford.mean
+            summary["var_" + name] = welford.var
+            summary["mse_" + name] = welford.var + welford.mean**2
+        for name, welford in [("nu", self.nu), ("a", self.a)]:
+            summary["mean_" + name] = welford.mean
+            summary["final_" + name] = welford.last
+        return summary
@@ -0,0 +1,263 @@
+# Copyright (c) 2021 Francesco Mannella, Federico Maggiore
+#
+# MIT License
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Parameter sweeps over run_simulation. Each run is stored as a small
+# .npz shard named after the hash of its configuration, so a sweep that
+# is restarted only runs the configurations that have no shard yet.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .runner import make_config, run_simulation
+import numpy as np
+import itertools
+import hashlib
+import json
+import glob
+import os
+
+
+def grid(params):
+    """
+    Expand a parameter grid into a list of configurations
+
+    Args:
+        params: dict, maps each parameter name to the list of its values,
+                e.g. {"eta_a": [0.01, 0.02], "type": ["still", "large"]}
+
+    Returns:
+        list of dict, one configuration per combination of values
+    """
+    names = sorted(params)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[params[n] for n in names])]
+
+
+def run_key(config):
+    """
+    Stable identifier of a configuration, used as the name of its shard
+    """
+    text = json.dumps(config, sort_keys=True, default=float)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def run_seed(base_seed, key):
+    """
+    Seed of a run. It depends only on the base seed and on the
+    configuration, not on the order or on the worker that runs it.
+    """
+    seq = np.random.SeedSequence([base_seed, int(key, 16)])
+    return int(seq.generate_state(1)[0])
+
+
+def summarize(result):
+    """
+    Reduce a run to a few scalar metrics of its first whisker
+
+    Args:
+        result: dict, returned by run_simulation with config["stats"]
+    """
+    stats = result["stats"]
+    summary = {name: stats[name][0] for name in [
+        "final_a", "final_nu", "mean_a", "mean_nu", "mse_PE_mu",
+        "mse_PE_s_p", "mse_PE_s_t", "mean_free_energy", "converged_at"]}
+    summary["collision_rate"] = np.mean(result["collision_rate"])
+    return summary
+
+
+def run_one(config, key, path):
+    """
+    Run a single configuration and write its shard. Only the streaming
+    summaries of the run are kept, not its trajectories.
+
+    Returns:
+        str, the key of the run
+    """
+    summary = summarize(run_simulation(
+        dict(config, stats=True, trajectory=False)))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, config=json.dumps(config, sort_keys=True, default=float),
+                 **summary)
+    # the shard appears only once it is complete
+    os.replace(tmp, path)
+    return key
+
+
+def sweep(params, outdir, base_config=None, base_seed=0, workers=None):
+    """
+    Run all the configurations of a grid over a pool of processes
+
+    Args:
+        params: dict, the parameter grid (see grid)
+        outdir: str, folder holding one shard per run
+        base_config: dict, parameters shared by all runs
+        base_seed: int, seed from which the seed of each run is derived
+        workers: int, number of processes (default: number of cpus)
+
+    Returns:
+        list of str, the keys of all the runs of the grid
+    """
+    os.makedirs(outdir, exist_ok=True)
+    jobs = []
+    keys = []
+    for point in grid(params):
+        config = make_config(base_config, **point)
+        key = run_key(dict(config, seed=base_seed))
+        keys.append(key)
+        path = os.path.join(outdir, key + ".npz")
+        if os.path.exists(path):
+            continue
+        config["seed"] = run_seed(base_seed, key)
+        jobs.append((config, key, path))
+
+    print("%d runs, %d already done" % (len(keys), len(keys) - len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_one, *job) for job in jobs]
+        for n, future in enumerate(as_completed(futures)):
+            print("done %s (%d/%d)" % (future.result(), n + 1, len(jobs)))
+
+    return keys
+
+
+def warmup(config, stop, outdir):
+    """
+    Run a shared prefix once and save its final state
+
+    Args:
+        config: dict, configuration of the prefix
+        stop: int, step at which the prefix ends
+        outdir: str, folder of the snapshot
+
+    Returns:
+        str, the path of the snapshot (see checkpoint.save)
+    """
+    config = make_config(config, stop=stop)
+    os.makedirs(outdir, exist_ok=True)
+    path = os.path.join(outdir, run_key(config) + ".npz")
+    if not os.path.exists(path):
+        run_simulation(dict(config, checkpoint=path))
+    return path
+
+
+def branch(params, outdir, base_config=None, stop=None, workers=None):
+    """
+    Run the continuations of a grid of configurations from the state
+    that a shared prefix reaches at step stop. The prefix runs once;
+    only the parameters that act after it should vary (e.g. the type
+    of box or the learning rates). All continuations also start from
+    the same state of the noise generators.
+
+    Args:
+        params: dict, the grid of the continuations (see grid)
+        outdir: str, folder holding one shard per continuation, and
+                the snapshot of the prefix in its "warmup" subfolder
+        base_config: dict, configuration of the prefix
+        stop: int, step at which the continuations branch off (default:
+              half of the run)
+        workers: int, number of processes (default: number of cpus)
+
+    Returns:
+        list of str, the keys of all the continuations
+    """
+    os.makedirs(outdir, exist_ok=True)
+    base_config = make_config(base_config)
+    if stop is None:
+        stop = base_config["stime"] // 2
+    snapshot = warmup(base_config, stop, os.path.join(outdir, "warmup"))
+
+    jobs = []
+    keys = []
+    for point in grid(params):
+        config = make_config(base_config, resume=snapshot, **point)
+        key = run_key(config)
+        keys.append(key)
+        path = os.path.join(outdir, key + ".npz")
+        if not os.path.exists(path):
+            jobs.append((config, key, path))
+
+    print("%d runs from step %d, %d already done" %
+          (len(keys), stop, len(keys) - len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_one, *job) for job in jobs]
+        for n, future in enumerate(as_completed(futures)):
+            print("done %s (%d/%d)" % (future.result(), n + 1, len(jobs)))
+
+    return keys
+
+
+def load(outdir):
+    """
+    Collect the shards of a sweep
+
+    Returns:
+        dict, "config" holds the list of the configurations and each
+        metric holds the array of its values, one per run
+    """
+    paths = sorted(glob.glob(os.path.join(outdir, "*.npz")))
+    results = {}
+    for path in paths:
+        with np.load(path) as shard:
+            for name in shard.files:
+                value = shard[name]
+                if name == "config":
+                    value = json.loads(str(value))
+                results.setdefault(name, []).append(value)
+    return {name: values if name == "config" else np.array(values)
+            for name, values in results.items()}
+
+
+def main(argv=None):
+    """
+    Run a sweep, or its branches from a shared warm-up
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("grid",
+                        help="json dict mapping parameters to lists of "
+                        "values, e.g. '{\"eta_a\": [0.01, 0.02]}'")
+    parser.add_argument("-o", "--outdir", default="sweep",
+                        help="folder where results are stored")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="base seed of the sweep")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of processes")
+    parser.add_argument("--stime", type=int, default=None,
+                        help="number of steps of each run")
+    parser.add_argument("--branch", type=int, default=None, metavar="STEP",
+                        help="run the grid as continuations of a single "
+                        "run (with the base seed) from this step")
+    from .profiling import add_startup_option
+    add_startup_option(parser, "whiskers.sweep")
+    args = parser.parse_args(argv)
+
+    base_config = {} if args.stime is None else {"stime": args.stime}
+    if args.branch is not None:
+        base_config["seed"] = args.seed
+        branch(json.loads(args.grid), args.outdir, base_config,
+               stop=args.branch, workers=args.workers)
+    else:
+        sweep(json.loads(args.grid), args.outdir, base_config,
+              base_seed=args.seed, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()